@@ -5,22 +5,25 @@
 #                It first cleans the documents by removing stopwords (like pronouns and conjunctions) and applying stemming to reduce word variations (e.g., "cats" to "cat"). 
 #                The terms "love," "cat," and "dog" are chosen as index terms, and their TF-IDF scores are calculated for each document. 
 #                The final output is a matrix where each row represents a document, and each column shows the TF-IDF value for the corresponding term.
+#                With --stream the CSV is read in chunks instead: document frequencies are counted in one pass and the
+#                TF-IDF rows are built in a second pass, for the given terms or the full vocabulary (--all-terms).
+#                --save writes the matrix as a compressed sparse row (CSR) file that --load memory-maps without the CSV.
 # FOR: CS 5180- Assignment #1
 # TIME SPENT: 20 min
 #-----------------------------------------------------------*/
 # Importing some Python libraries
 import csv
-from collections import defaultdict
+import sys
+import mmap
+import time
+import struct
+import argparse
+import tracemalloc
+from array import array
+from collections import defaultdict, Counter
+from itertools import islice
 import math
 
-# Reading the data in a csv file
-documents = []
-with open('collection.csv', 'r') as csvfile:
-    reader = csv.reader(csvfile)
-    for i, row in enumerate(reader):
-        if i > 0:  # skipping the header
-            documents.append(row[0])
-
 # Conducting stopword removal for pronouns/conjunctions. Hint: use a set to define stopwords.
 stopWords = {'i', 'she', 'he', 'they', 'her', 'his', 'their', 'and', 'the', 'a', 'an'}
 
@@ -41,12 +44,6 @@ def clean_document(doc):
             cleaned_words.append(stemmed_word)
     return cleaned_words
 
-# Cleaned documents
-cleaned_documents = [clean_document(doc) for doc in documents]
-
-# Identifying the index terms in the specified order: love, cat, dog
-terms = ['love', 'cat', 'dog']
-
 # Function to calculate term frequency (TF)
 def calculate_tf(term, document):
     term_count = document.count(term)
@@ -57,27 +54,244 @@ def calculate_idf(term, documents):
     doc_count_with_term = sum(1 for doc in documents if term in doc)
     return math.log10(len(documents) / (doc_count_with_term)) if doc_count_with_term > 0 else 0
 
+# Reading the data in a csv file
+def read_documents(path):
+    documents = []
+    with open(path, 'r') as csvfile:
+        reader = csv.reader(csvfile)
+        for i, row in enumerate(reader):
+            if i > 0:  # skipping the header
+                documents.append(row[0])
+    return documents
+
 # Building the document-term matrix by using the tf-idf weights.
-docTermMatrix = []
-for doc in cleaned_documents:
-    tfidf_row = []
-    for term in terms:
-        tf = calculate_tf(term, doc)
-        idf = calculate_idf(term, cleaned_documents)
-        tfidf_row.append(tf * idf)
-    docTermMatrix.append(tfidf_row)
+def build_matrix(documents, terms):
+    # Cleaned documents
+    cleaned_documents = [clean_document(doc) for doc in documents]
+    docTermMatrix = []
+    for doc in cleaned_documents:
+        tfidf_row = []
+        for term in terms:
+            tf = calculate_tf(term, doc)
+            idf = calculate_idf(term, cleaned_documents)
+            tfidf_row.append(tf * idf)
+        docTermMatrix.append(tfidf_row)
+    return docTermMatrix
+
+# Reading the csv file lazily, chunk_size documents at a time, so only one chunk is held in memory
+def read_document_chunks(path, chunk_size=10000):
+    with open(path, 'r', newline='') as csvfile:
+        reader = csv.reader(csvfile)
+        next(reader, None)  # skipping the header
+        while True:
+            chunk = [row[0] for row in islice(reader, chunk_size)]
+            if not chunk:
+                return
+            yield chunk
+
+# First pass: count every term's document frequency once, instead of rescanning the documents per cell
+def count_document_frequencies(path, chunk_size=10000):
+    num_docs = 0
+    doc_freq = Counter()
+    for chunk in read_document_chunks(path, chunk_size):
+        for doc in chunk:
+            doc_freq.update(set(clean_document(doc)))
+        num_docs += len(chunk)
+    return num_docs, doc_freq
+
+# Same formula as calculate_idf, from the precomputed document frequencies
+def idf_weights(terms, num_docs, doc_freq):
+    return {term: math.log10(num_docs / doc_freq[term]) if doc_freq[term] > 0 else 0 for term in terms}
+
+# Second pass: yield one TF-IDF row per document, counting each document's terms once
+def stream_tfidf_rows(path, terms, idf, chunk_size=10000):
+    for chunk in read_document_chunks(path, chunk_size):
+        for doc in chunk:
+            words = clean_document(doc)
+            counts = Counter(words)
+            length = len(words)
+            yield [counts[term] / length * idf[term] if length > 0 else 0 for term in terms]
+
+# CSR file layout: a header, then 8-byte aligned sections in this order:
+#   indptr (num_docs + 1 uint64)   row i's entries are [indptr[i], indptr[i+1])
+#   doc_ids (num_docs uint64)      CSV row number of each matrix row, starting at 1
+#   indices (nnz uint32)           column of each entry, ascending within a row
+#   data (nnz float64)             TF-IDF value of each entry
+#   term_offsets (num_terms + 1 uint64), then the UTF-8 terms back to back
+# Arrays are stored in the writer's byte order, recorded in the header.
+CSR_MAGIC = b'TFIDFCSR'
+CSR_HEADER = struct.Struct('<8s8sQQQ')
+
+def csr_sections(num_docs, num_terms, nnz):
+    sizes = [('indptr', 'Q', num_docs + 1), ('doc_ids', 'Q', num_docs), ('indices', 'I', nnz),
+             ('data', 'd', nnz), ('term_offsets', 'Q', num_terms + 1)]
+    offset = CSR_HEADER.size
+    sections = {}
+    for name, typecode, count in sizes:
+        sections[name] = (offset, typecode, count)
+        offset += -(-count * array(typecode).itemsize // 8) * 8
+    sections['terms'] = (offset, 'B', None)
+    return sections
+
+# Building only the nonzero TF-IDF entries, streamed like stream_tfidf_rows
+def build_csr(path, terms, idf, chunk_size=10000):
+    columns = {term: col for col, term in enumerate(terms)}
+    indptr, doc_ids, indices, data = array('Q', [0]), array('Q'), array('I'), array('d')
+    doc_id = 0
+    for chunk in read_document_chunks(path, chunk_size):
+        for doc in chunk:
+            doc_id += 1
+            words = clean_document(doc)
+            length = len(words)
+            entries = []
+            for term, count in Counter(words).items():
+                col = columns.get(term)
+                if col is not None and idf[term] != 0:
+                    entries.append((col, count / length * idf[term]))
+            entries.sort()
+            indices.extend(col for col, _ in entries)
+            data.extend(value for _, value in entries)
+            indptr.append(len(indices))
+            doc_ids.append(doc_id)
+    return indptr, doc_ids, indices, data
+
+def save_csr(out_path, terms, indptr, doc_ids, indices, data):
+    encoded = [term.encode('utf-8') for term in terms]
+    term_offsets = array('Q', [0])
+    for term in encoded:
+        term_offsets.append(term_offsets[-1] + len(term))
+    sections = csr_sections(len(doc_ids), len(terms), len(indices))
+    with open(out_path, 'wb') as f:
+        f.write(CSR_HEADER.pack(CSR_MAGIC, sys.byteorder.encode().ljust(8, b'\0'),
+                                len(doc_ids), len(terms), len(indices)))
+        for name, values in (('indptr', indptr), ('doc_ids', doc_ids), ('indices', indices),
+                             ('data', data), ('term_offsets', term_offsets)):
+            f.seek(sections[name][0])
+            values.tofile(f)
+        f.seek(sections['terms'][0])
+        f.write(b''.join(encoded))
+
+# Read-only view of a saved CSR file: the arrays are memoryviews over one mmap, so loading copies nothing
+class CSRMatrix:
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, byteorder, self.num_docs, self.num_terms, self.nnz = CSR_HEADER.unpack_from(self._map)
+        if magic != CSR_MAGIC:
+            raise ValueError(f"{path} is not a TF-IDF CSR file")
+        byteorder = byteorder.rstrip(b'\0').decode()
+        if byteorder != sys.byteorder:
+            raise ValueError(f"{path} was written with {byteorder}-endian arrays")
+        view = memoryview(self._map)
+        self._views = [view]
+        for name, (offset, typecode, count) in csr_sections(self.num_docs, self.num_terms, self.nnz).items():
+            if count is None:
+                section = view[offset:]
+            else:
+                section = view[offset:offset + count * array(typecode).itemsize].cast(typecode)
+            self._views.append(section)
+            setattr(self, name, section)
+        self._columns = None
+
+    def term(self, col):
+        return bytes(self.terms[self.term_offsets[col]:self.term_offsets[col + 1]]).decode('utf-8')
+
+    def column(self, term):
+        # The term dictionary is only decoded on the first lookup by term
+        if self._columns is None:
+            self._columns = {self.term(col): col for col in range(self.num_terms)}
+        return self._columns.get(term)
+
+    def row(self, i):
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return dict(zip(self.indices[start:end], self.data[start:end]))
+
+    def get(self, i, term):
+        col = self.column(term)
+        if col is None:
+            return 0
+        start, end = self.indptr[i], self.indptr[i + 1]
+        # Columns are sorted within a row, so binary search them
+        while start < end:
+            middle = (start + end) // 2
+            if self.indices[middle] < col:
+                start = middle + 1
+            else:
+                end = middle
+        return self.data[start] if start < self.indptr[i + 1] and self.indices[start] == col else 0
+
+    def dense_rows(self, terms):
+        cols = [self.column(term) for term in terms]
+        for i in range(self.num_docs):
+            row = self.row(i)
+            yield [row.get(col, 0) for col in cols]
+
+    def close(self):
+        for section in reversed(self._views):
+            section.release()
+        self._map.close()
+        self._file.close()
 
 # Printing the matrix with documents as rows and terms as columns in the specified order
-# Printing header (terms as columns)
-print(f"{'Doc':<10}", end="")
-for term in terms:
-    print(f"{term:<10}", end="")
-print()
-
-# Printing each document's row with corresponding TF-IDF values
-for i, doc in enumerate(documents):
-    print(f"Doc{i+1:<10}", end="")  # Print Doc1, Doc2, Doc3, etc.
-    for tfidf_value in docTermMatrix[i]:
-        print(f"{tfidf_value:<10.4f}", end="")
+def print_matrix(terms, rows):
+    # Printing header (terms as columns)
+    print(f"{'Doc':<10}", end="")
+    for term in terms:
+        print(f"{term:<10}", end="")
     print()
 
+    # Printing each document's row with corresponding TF-IDF values
+    for i, row in enumerate(rows):
+        print(f"Doc{i+1:<10}", end="")  # Print Doc1, Doc2, Doc3, etc.
+        for tfidf_value in row:
+            print(f"{tfidf_value:<10.4f}", end="")
+        print()
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the TF-IDF document-term matrix of a CSV collection")
+    parser.add_argument('csv', nargs='?', default='collection.csv', help="CSV file with a header row and one document per row")
+    parser.add_argument('--terms', nargs='+', default=['love', 'cat', 'dog'], help="index terms, in column order")
+    parser.add_argument('--all-terms', action='store_true', help="use the full (sorted) vocabulary as index terms; implies --stream")
+    parser.add_argument('--stream', action='store_true', help="read the CSV in chunks with one document-frequency pass")
+    parser.add_argument('--chunk-size', type=int, default=10000, help="documents read per chunk when streaming")
+    parser.add_argument('--save', metavar='PATH', help="also write the matrix to a CSR file; implies --stream")
+    parser.add_argument('--load', metavar='PATH', help="print the matrix from a CSR file instead of the CSV")
+    args = parser.parse_args()
+
+    # Identifying the index terms in the specified order: love, cat, dog by default
+    terms = args.terms
+
+    if args.load:
+        tracemalloc.start()
+        started = time.perf_counter()
+        matrix = CSRMatrix(args.load)
+        load_seconds = time.perf_counter() - started
+        heap_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        if args.all_terms:
+            terms = [matrix.term(col) for col in range(matrix.num_terms)]
+        print_matrix(terms, matrix.dense_rows(terms))
+        print(f"Loaded {matrix.num_docs} x {matrix.num_terms} matrix ({matrix.nnz} nonzeros) in {load_seconds * 1000:.3f} ms: "
+              f"{len(matrix._map)} bytes mapped, {heap_bytes} bytes of Python heap", file=sys.stderr)
+        matrix.close()
+    elif args.save:
+        num_docs, doc_freq = count_document_frequencies(args.csv, args.chunk_size)
+        if args.all_terms:
+            terms = sorted(doc_freq)
+        idf = idf_weights(terms, num_docs, doc_freq)
+        indptr, doc_ids, indices, data = build_csr(args.csv, terms, idf, args.chunk_size)
+        save_csr(args.save, terms, indptr, doc_ids, indices, data)
+        matrix = CSRMatrix(args.save)
+        print_matrix(terms, matrix.dense_rows(terms))
+        matrix.close()
+    elif args.stream or args.all_terms:
+        num_docs, doc_freq = count_document_frequencies(args.csv, args.chunk_size)
+        if args.all_terms:
+            terms = sorted(doc_freq)
+        idf = idf_weights(terms, num_docs, doc_freq)
+        print_matrix(terms, stream_tfidf_rows(args.csv, terms, idf, args.chunk_size))
+    else:
+        print_matrix(terms, build_matrix(read_documents(args.csv), terms))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#-------------------------------------------------------------------------
+# FILENAME: db_connection_mongo_async.py
+# SPECIFICATION: asyncio variant of the document store operations in db_connection_mongo_solution.py.
+#                One shared MongoClient provides the connection pool; each call runs the synchronous
+#                operation on a worker thread, with driver timeouts and a bound on in-flight calls.
+#                Reads are retried with exponential backoff on transient network errors; writes are
+#                not, since each one spans several driver calls, and rely on the driver's retryWrites.
+#                Writes to the same document run one at a time, so inverted index diffs never overlap.
+# FOR: CS 5180- Assignment #2
+#-----------------------------------------------------------*/
+
+import asyncio
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pymongo.errors import AutoReconnect
+from db_connection_mongo_solution import (getClient, createDocument, updateDocument, deleteDocument,
+                                          getIndex, getIndexMaterialized)
+
+class AsyncDocumentStore:
+
+    def __init__(self, db_name="CPP", host="localhost", port=27017, max_pool_size=100, timeout=5.0,
+                 retries=3, backoff=0.1, client=None):
+        # Driver-level timeouts, so a stuck call fails on its worker thread instead of holding it forever
+        timeout_ms = int(timeout * 1000)
+        self.client = client if client is not None else getClient(
+            host, port, maxPoolSize=max_pool_size, serverSelectionTimeoutMS=timeout_ms,
+            connectTimeoutMS=timeout_ms, socketTimeoutMS=timeout_ms, retryWrites=True)
+        self.db = self.client[db_name]
+        self.retries = retries
+        self.backoff = backoff
+
+        # As many worker threads as pooled connections, so no call waits for both a thread and a connection
+        self.max_in_flight = max_pool_size
+        self._executor = ThreadPoolExecutor(max_workers=max_pool_size, thread_name_prefix="mongo")
+        self._slots = None
+        # (collection, docId) -> [lock, callers holding or waiting for it]; entries go when unused
+        self._document_locks = {}
+
+    async def _run(self, operation, *args, retry=False):
+        # Callers may schedule any number of calls; at most max_in_flight run at once, the rest queue here.
+        # Only operations safe to repeat as a whole may set retry: createDocument, updateDocument and
+        # deleteDocument are several driver calls each, and rerunning one after a partial success would
+        # fail on the inserted _id or compute an empty index diff from the already written document.
+        # Their individual writes are retried by the driver instead (retryWrites)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            for attempt in range(self.retries + 1 if retry else 1):
+                try:
+                    return await loop.run_in_executor(self._executor, partial(operation, *args))
+                except AutoReconnect:
+                    # Connection lost, network timeout or no server selectable: transient, so back off and retry
+                    if not retry or attempt == self.retries:
+                        raise
+                    await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    @asynccontextmanager
+    async def _document_lock(self, col, docId):
+        # updateDocument and deleteDocument read the old terms, write the document, then apply the
+        # difference to the inverted index; two such writes to one document at once would both diff
+        # against the same old terms and leave stale postings, so writes to a document are serialized
+        key = (col.full_name, docId)
+        entry = self._document_locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._document_locks[key]
+
+    async def createDocument(self, col, docId, docText, docTitle, docDate, docCat, index_col=None):
+        async with self._document_lock(col, docId):
+            return await self._run(createDocument, col, docId, docText, docTitle, docDate, docCat, index_col)
+
+    async def updateDocument(self, col, docId, docText, docTitle, docDate, docCat, index_col=None):
+        async with self._document_lock(col, docId):
+            return await self._run(updateDocument, col, docId, docText, docTitle, docDate, docCat, index_col)
+
+    async def deleteDocument(self, col, docId, index_col=None):
+        async with self._document_lock(col, docId):
+            return await self._run(deleteDocument, col, docId, index_col)
+
+    async def getIndex(self, col, index_col=None):
+        if index_col is not None:
+            return await self._run(getIndexMaterialized, index_col, retry=True)
+        return await self._run(getIndex, col, retry=True)
+
+    def close(self):
+        # Waits for running calls; the shared client stays open for other users of the pool
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
@@ -1,20 +1,34 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+import os
+import csv
+import json
 import datetime
+from itertools import islice
 from collections import defaultdict
 
+# One client (and so one connection pool) per server and set of options, shared by every caller
+_clients = {}
+
+def getClient(host="localhost", port=27017, **options):
+    key = (host, port, tuple(sorted(options.items())))
+    if key not in _clients:
+        _clients[key] = MongoClient(host=host, port=port, **options)
+    return _clients[key]
+
 def connectDataBase():
     DB_NAME = "CPP"
     DB_HOST = "localhost"
     DB_PORT = 27017
 
     try:
-        client = MongoClient(host=DB_HOST, port=DB_PORT)
+        client = getClient(DB_HOST, DB_PORT)
         db = client[DB_NAME]
         return db
-    except:
+    except PyMongoError:
         print("Database not connected successfully")
 
-def createDocument(col, docId, docText, docTitle, docDate, docCat):
+def buildTerms(docText):
     # Tokenize the text and create the terms list
     terms = []
     word_counts = defaultdict(int)
@@ -30,35 +44,37 @@ def createDocument(col, docId, docText, docTitle, docDate, docCat):
             "num_chars": len(word)
         })
 
+    return terms
+
+def buildDocument(docId, docText, docTitle, docDate, docCat):
     # Create the document
-    document = {
+    return {
         "_id": docId,
         "title": docTitle,
         "text": docText,
         "num_chars": sum(len(word) for word in docText.split()),
         "date": datetime.datetime.strptime(docDate, "%Y-%m-%d"),
         "category": docCat,
-        "terms": terms
+        "terms": buildTerms(docText)
     }
 
+def createDocument(col, docId, docText, docTitle, docDate, docCat, index_col=None):
+    document = buildDocument(docId, docText, docTitle, docDate, docCat)
+
     # Insert the document
     col.insert_one(document)
 
-def updateDocument(col, docId, docText, docTitle, docDate, docCat):
+    # Keep the materialized inverted index in sync
+    if index_col is not None:
+        addPostings(index_col, docId, docTitle, document['terms'])
+
+def updateDocument(col, docId, docText, docTitle, docDate, docCat, index_col=None):
     # Tokenize the text and create the terms list (same as in createDocument)
-    terms = []
-    word_counts = defaultdict(int)
-    for word in docText.split():
-        word = word.lower().strip('.,!?')
-        if word:
-            word_counts[word] += 1
-    
-    for word, count in word_counts.items():
-        terms.append({
-            "term": word,
-            "count": count,
-            "num_chars": len(word)
-        })
+    terms = buildTerms(docText)
+
+    # Previous terms, to update the materialized inverted index
+    if index_col is not None:
+        old_doc = col.find_one({"_id": docId}, {"terms.term": 1})
 
     # Update the document
     col.update_one(
@@ -75,10 +91,45 @@ def updateDocument(col, docId, docText, docTitle, docDate, docCat):
         }
     )
 
-def deleteDocument(col, docId):
+    if index_col is not None and old_doc is not None:
+        old_terms = {term['term'] for term in old_doc['terms']}
+        new_terms = {term['term'] for term in terms}
+        # Terms kept by the update change in place, so the document keeps its position in their lists
+        ops = [UpdateOne({"_id": term['term'], "docs.doc": docId},
+                         {"$set": {"docs.$.title": docTitle, "docs.$.count": term['count']}})
+               for term in terms if term['term'] in old_terms]
+        if ops:
+            index_col.bulk_write(ops, ordered=False)
+        removePostings(index_col, docId, old_terms - new_terms)
+        addPostings(index_col, docId, docTitle, [term for term in terms if term['term'] not in old_terms])
+
+def deleteDocument(col, docId, index_col=None):
+    # Previous terms, to update the materialized inverted index
+    if index_col is not None:
+        old_doc = col.find_one({"_id": docId}, {"terms.term": 1})
+
     # Delete the document
     col.delete_one({"_id": docId})
 
+    if index_col is not None and old_doc is not None:
+        removePostings(index_col, docId, {term['term'] for term in old_doc['terms']})
+
+def addPostings(index_col, docId, docTitle, terms):
+    # Append the document to each term's postings, creating new terms
+    ops = [UpdateOne({"_id": term['term']},
+                     {"$push": {"docs": {"doc": docId, "title": docTitle, "count": term['count']}}},
+                     upsert=True)
+           for term in terms]
+    if ops:
+        index_col.bulk_write(ops, ordered=False)
+
+def removePostings(index_col, docId, terms):
+    # Remove the document from each term's postings and drop terms left without documents
+    if not terms:
+        return
+    index_col.update_many({"_id": {"$in": list(terms)}}, {"$pull": {"docs": {"doc": docId}}})
+    index_col.delete_many({"_id": {"$in": list(terms)}, "docs": {"$size": 0}})
+
 def getIndex(col):
     # Create an inverted index
     inverted_index = defaultdict(lambda: defaultdict(int))
@@ -93,4 +144,126 @@ def getIndex(col):
     for term, docs in sorted(inverted_index.items()):
         formatted_index[term] = ', '.join(f"{title}:{count}" for title, count in docs.items())
     
-    return formatted_index
\ No newline at end of file
+    return formatted_index
+
+def formatPostings(postings):
+    # Same "title:count, ..." format as getIndex; a repeated title keeps its position and last count
+    docs = {}
+    for posting in postings:
+        docs[posting['title']] = posting['count']
+    return ', '.join(f"{title}:{count}" for title, count in docs.items())
+
+# Pipeline computing the inverted index inside MongoDB: only titles and term counts leave the documents
+INDEX_PIPELINE = [
+    {"$project": {"_id": 0, "doc": "$_id", "title": 1, "terms.term": 1, "terms.count": 1}},
+    {"$unwind": "$terms"},
+    {"$group": {
+        "_id": "$terms.term",
+        "docs": {"$push": {"doc": "$doc", "title": "$title", "count": "$terms.count"}}
+    }},
+    {"$sort": {"_id": 1}}
+]
+
+def getIndexAggregate(col):
+    # Same output as getIndex, grouped and sorted by the server instead of in Python
+    return dict(iterIndex(col))
+
+def iterIndex(col, index_col=None, batch_size=1000):
+    # Yield (term, postings) in term order from a server-side cursor, holding one batch at a time.
+    # Reads the materialized index when index_col is given, otherwise aggregates col
+    if index_col is not None:
+        cursor = index_col.find().sort("_id", 1).batch_size(batch_size)
+    else:
+        cursor = col.aggregate(INDEX_PIPELINE, allowDiskUse=True, batchSize=batch_size)
+    for entry in cursor:
+        yield entry['_id'], formatPostings(entry['docs'])
+
+def exportIndex(col, path, index_col=None, batch_size=1000):
+    # Write the index as "term: postings" lines without building it in memory
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for term, postings in iterIndex(col, index_col, batch_size):
+            f.write(f"{term}: {postings}\n")
+            count += 1
+    return count
+
+def rebuildIndex(col, index_col):
+    # Materialize the inverted index from scratch, e.g. for a collection filled without index_col
+    index_col.drop()
+    col.aggregate(INDEX_PIPELINE + [{"$out": index_col.name}], allowDiskUse=True)
+
+def getIndexMaterialized(index_col):
+    # Read the index kept by createDocument/updateDocument/deleteDocument; cost depends only on the index size.
+    # Each term lists its documents in the order they gained the term, not in collection order
+    return dict(iterIndex(None, index_col))
+
+# Fields of each CSV row or JSONL object read by loadDocuments
+IMPORT_FIELDS = ("id", "text", "title", "date", "category")
+
+def readDocuments(path):
+    # Yield (line number, record) from a CSV file with a header row, or from a JSONL file (one
+    # object per line). JSONL lines are yielded unparsed so a malformed line fails on its own
+    if os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson'):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if line.strip():
+                    yield line_number, line
+    else:
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+
+def recordFields(record):
+    # The IMPORT_FIELDS of a CSV row or JSON object as strings; missing or null fields
+    # (short CSV rows give None) are errors rather than the text "None"
+    if not isinstance(record, dict):
+        raise TypeError(f"expected an object, got {type(record).__name__}")
+    missing = [field for field in IMPORT_FIELDS if record.get(field) is None]
+    if missing:
+        raise ValueError(f"missing fields: {', '.join(missing)}")
+    return [str(record[field]) for field in IMPORT_FIELDS]
+
+def loadDocuments(col, path, batch_size=1000, index_col=None):
+    # Bulk import: tokenize batch_size records at a time and insert each batch with one unordered
+    # insert_many, so a failed record (e.g. a duplicate id) does not stop the rest of its batch
+    inserted = 0
+    errors = []
+    records = readDocuments(path)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        documents = []
+        for line_number, record in batch:
+            try:
+                if isinstance(record, str):
+                    record = json.loads(record)
+                documents.append(buildDocument(*recordFields(record)))
+            except (KeyError, ValueError, TypeError) as e:
+                label = record.get('id') if isinstance(record, dict) and record.get('id') is not None \
+                    else f"line {line_number}"
+                errors.append(f"{label}: {e!r}")
+
+        failed = set()
+        if documents:
+            try:
+                col.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details['writeErrors']:
+                    failed.add(error['index'])
+                    errors.append(f"{documents[error['index']]['_id']}: {error['errmsg']}")
+        added = [document for i, document in enumerate(documents) if i not in failed]
+        inserted += len(added)
+
+        # One upsert per distinct term for the whole batch
+        if index_col is not None and added:
+            postings = defaultdict(list)
+            for document in added:
+                for term in document['terms']:
+                    postings[term['term']].append(
+                        {"doc": document['_id'], "title": document['title'], "count": term['count']})
+            index_col.bulk_write([UpdateOne({"_id": term}, {"$push": {"docs": {"$each": docs}}}, upsert=True)
+                                  for term, docs in postings.items()], ordered=False)
+
+    return {"inserted": inserted, "failed": len(errors), "errors": errors}
@@ -17,6 +17,11 @@ if __name__ == '__main__':
     # Creating a collection
     documents = db["documents"]
 
+    # Materialized inverted index, kept in sync by the create/update/delete options
+    inverted_index = db["inverted_index"]
+    if inverted_index.estimated_document_count() == 0 and documents.estimated_document_count() > 0:
+        rebuildIndex(documents, inverted_index)
+
     #print a menu
     print("")
     print("######### Menu ##############")
@@ -24,6 +29,10 @@ if __name__ == '__main__':
     print("#b - Update a document")
     print("#c - Delete a document.")
     print("#d - Output the inverted index ordered by term.")
+    print("#e - Output the inverted index computed by MongoDB (aggregation).")
+    print("#f - Rebuild the materialized inverted index.")
+    print("#g - Import documents from a CSV or JSONL file.")
+    print("#h - Export the inverted index ordered by term to a file.")
     print("#q - Quit")
 
     option = ""
@@ -40,7 +49,7 @@ if __name__ == '__main__':
               docDate = input("Enter the date of the document: ")
               docCat = input("Enter the category of the document: ")
 
-              createDocument(documents, docId, docText, docTitle, docDate, docCat)
+              createDocument(documents, docId, docText, docTitle, docDate, docCat, inverted_index)
 
           elif (option == "b"):
 
@@ -50,19 +59,45 @@ if __name__ == '__main__':
               docDate = input("Enter the date of the document: ")
               docCat = input("Enter the category of the document: ")
 
-              updateDocument(documents, docId, docText, docTitle, docDate, docCat)
+              updateDocument(documents, docId, docText, docTitle, docDate, docCat, inverted_index)
 
           elif (option == "c"):
 
               docId = input("Enter the document ID to be deleted: ")
 
-              deleteDocument(documents, docId)
+              deleteDocument(documents, docId, inverted_index)
 
           elif (option == "d"):
 
-              index = getIndex(documents)
+              index = getIndexMaterialized(inverted_index)
+              print(index)
+
+          elif (option == "e"):
+
+              index = getIndexAggregate(documents)
               print(index)
 
+          elif (option == "f"):
+
+              rebuildIndex(documents, inverted_index)
+
+          elif (option == "g"):
+
+              path = input("Enter the CSV/JSONL file (fields: id, text, title, date, category): ")
+              batchSize = input("Enter the batch size [1000]: ")
+
+              result = loadDocuments(documents, path, int(batchSize or 1000), inverted_index)
+              print(f"Inserted {result['inserted']} documents, {result['failed']} failed")
+              for error in result['errors'][:10]:
+                  print(error)
+
+          elif (option == "h"):
+
+              path = input("Enter the output file: ")
+
+              count = exportIndex(documents, path, inverted_index)
+              print(f"Wrote {count} terms to {path}")
+
           elif (option == "q"):
 
                print("Leaving the application ... ")
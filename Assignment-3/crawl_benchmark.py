@@ -0,0 +1,305 @@
+"""Offline benchmark for the question5 and question6 crawlers
+
+Generates a synthetic site (a breadth-first tree of pages with a given
+fan-out and depth, extra links back to pages already in the tree, and
+broken, external and non-HTML links), plants the faculty page somewhere
+in it and serves it from a local HTTP server with a configurable latency
+per request. Each crawler then runs against that site with mongomock as
+its database, and the results are written as JSON: pages/sec, time to the
+target page, per-stage metrics and memory.
+
+    python crawl_benchmark.py --pages 2000 --latency 0.02 --output crawl.json
+    python crawl_benchmark.py --crawler question5 --in-flight 32 --latency 0.1
+"""
+import io
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tracemalloc
+import contextlib
+import importlib.util
+import multiprocessing
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from crawl_metrics import CrawlMetrics
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+SITE_ROOT = "/sci/computer-science/"
+TARGET_PATH = SITE_ROOT + "faculty-and-staff/permanent-faculty.shtml"
+TARGET_HEADING = "Permanent Faculty"
+FILLER = ("The department offers undergraduate and graduate programs in computer science, "
+          "with courses in algorithms, systems, data science and software engineering. ")
+
+
+def page_path(i):
+    return SITE_ROOT if i == 0 else f"{SITE_ROOT}section-{i % 7}/page-{i}.shtml"
+
+
+def professor_block(i, rng):
+    return (f'<div class="clearfix"><h2>Professor {i}</h2>'
+            f'<p><strong>Title:</strong> {rng.choice(["Professor", "Associate Professor", "Lecturer"])}</p>'
+            f'<p><strong>Office:</strong> 8-{rng.randint(1, 60)}</p>'
+            f'<p><strong>Phone:</strong> (909) 869-{rng.randint(1000, 9999)}</p>'
+            f'<p><strong>Email:</strong> <a href="mailto:prof{i}@cpp.edu">prof{i}@cpp.edu</a></p>'
+            f'<p><strong>Web:</strong> <a href="https://www.cpp.edu/faculty/prof{i}/">Website</a></p></div>')
+
+
+def generate_site(pages=1000, fan_out=8, depth=5, duplicate_links=4, noise_links=2, page_bytes=8000,
+                  professors=40, target_depth=None, seed=0):
+    """Build a synthetic site as {path: html bytes}; returns (site, target path, target depth)
+
+    Pages form a breadth-first tree: the home page links to `fan_out`
+    children, each of those to `fan_out` more, down to `depth` levels or
+    until `pages` exist. Every page also links to `duplicate_links` random
+    pages of the tree (some with a #fragment, which the frontier has to
+    deduplicate, and some with a ?ref= query, which serves the same content
+    under another URL) and to `noise_links` missing pages,
+    PDFs or other hosts. The faculty page, listing `professors` profiles,
+    is a child of a random page at `target_depth - 1` (default: the
+    deepest level), so a breadth-first crawl reaches it near the end of
+    that level.
+    """
+    rng = random.Random(seed)
+    levels = [[0]]
+    children = {0: []}
+    count = 1
+    while len(levels) < depth and count < pages:
+        level = []
+        for parent in levels[-1]:
+            for _ in range(fan_out):
+                if count >= pages:
+                    break
+                children[parent].append(count)
+                children[count] = []
+                level.append(count)
+                count += 1
+        if not level:
+            break
+        levels.append(level)
+
+    target_depth = len(levels) if target_depth is None else max(1, min(target_depth, len(levels)))
+    target_parent = rng.choice(levels[target_depth - 1])
+
+    def link(path):
+        form = rng.random()
+        if form < 0.25:
+            return path + "#main"
+        if form < 0.35:
+            return path + "?ref=nav"
+        return path
+
+    filler = FILLER * max(1, page_bytes // len(FILLER))
+    site = {}
+    for i in range(count):
+        hrefs = [page_path(child) for child in children[i]]
+        if i == target_parent:
+            hrefs.insert(rng.randrange(len(hrefs) + 1), TARGET_PATH)
+        hrefs += [link(page_path(rng.randrange(count))) for _ in range(duplicate_links)]
+        for _ in range(noise_links):
+            hrefs.append(rng.choice([f"{SITE_ROOT}missing-{rng.randrange(count)}.shtml",
+                                     f"{SITE_ROOT}docs/catalog-{rng.randrange(count)}.pdf",
+                                     f"https://www.example.org/{rng.randrange(count)}"]))
+        links = ''.join(f'<li><a href="{href}">Link</a></li>' for href in hrefs)
+        site[page_path(i)] = (f'<html><head><title>Page {i}</title></head><body>'
+                              f'<h1 class="cpp-h1">Computer Science Page {i}</h1><nav><ul>{links}</ul></nav>'
+                              f'<main><p>{filler}</p></main></body></html>').encode('utf-8')
+
+    profiles = ''.join(professor_block(i, rng) for i in range(professors))
+    site[TARGET_PATH] = (f'<html><head><title>{TARGET_HEADING}</title></head><body>'
+                         f'<h1 class="cpp-h1">{TARGET_HEADING}</h1><section>{profiles}</section>'
+                         f'<a href="{SITE_ROOT}">Home</a></body></html>').encode('utf-8')
+    return site, TARGET_PATH, target_depth + 1
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    """Serves the synthetic site from memory after sleeping `latency` seconds per request"""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; with Nagle's algorithm on, a keep-alive client
+    # would wait on delayed ACKs between them
+    disable_nagle_algorithm = True
+    site = {}
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        path = self.path.split('?', 1)[0]
+        if path in self.site:
+            status, content_type, body = 200, 'text/html; charset=utf-8', self.site[path]
+        elif path.endswith('.pdf'):
+            status, content_type, body = 200, 'application/pdf', b'%PDF-1.4'
+        else:
+            status, content_type, body = 404, 'text/html; charset=utf-8', b'<html><body>Not found</body></html>'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _serve(site, latency, ready):
+    SiteHandler.site = site
+    SiteHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SiteHandler)
+    server.daemon_threads = True
+    ready.send(server.server_address[1])
+    server.serve_forever()
+
+
+def start_server(site, latency):
+    """Serve the site from a separate process, so it does not compete with the crawler for the GIL
+
+    Returns the process and the base URL.
+    """
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_serve, args=(site, latency, sender), daemon=True)
+    process.start()
+    port = receiver.recv()
+    return process, f"http://127.0.0.1:{port}"
+
+
+def load_question6():
+    # The file name is not a valid module name, so it cannot be imported normally
+    path = Path(__file__).with_name("question6_crawler&parser.py")
+    spec = importlib.util.spec_from_file_location("question6_crawler", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def max_rss_kb():
+    if resource is None:
+        return None
+    # kilobytes on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def run_crawler(name, base_url, args):
+    """Run one crawler to the target page against the served site; returns its results"""
+    import mongomock
+    db = mongomock.MongoClient()["crawl_benchmark"]
+    metrics = CrawlMetrics()
+    start_url = base_url + SITE_ROOT
+    prefix = base_url + SITE_ROOT.rstrip('/')
+
+    if args.trace_memory:
+        tracemalloc.start()
+    output = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr if args.verbose else output):
+        if name == 'question5':
+            import question5_crawler
+            found = asyncio.run(question5_crawler.crawl(
+                db["pages"], start_url, prefix, TARGET_HEADING, args.in_flight, args.per_host, args.delay,
+                args.window, parser=args.parser, batch_size=args.batch_size, compress=not args.no_compress,
+                metrics=metrics))
+        else:
+            question6 = load_question6()
+            found = question6.crawl(db["pages"], db["professors"], start_url, base_url + TARGET_PATH, prefix,
+                                    parser=args.parser, batch_size=args.batch_size,
+                                    compress=not args.no_compress, metrics=metrics)
+    elapsed = time.perf_counter() - started
+    peak = None
+    if args.trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    snapshot = metrics.snapshot()
+    # Stored HTML pages are comparable across crawlers; question5 also counts PDFs etc. as fetched
+    pages = db["pages"].count_documents({})
+    results = {
+        'found_target': found == base_url + TARGET_PATH,
+        'time_to_target_s': round(elapsed, 4) if found else None,
+        'seconds': round(elapsed, 4),
+        'pages_stored': pages,
+        'pages_per_sec': round(pages / elapsed, 2) if elapsed > 0 else 0.0,
+        'responses': snapshot['pages'],
+        'bytes_fetched': snapshot['bytes_fetched'],
+        'max_frontier_depth': snapshot['max_frontier_depth'],
+        'errors': snapshot['errors'],
+        'stages': snapshot['stages'],
+        'memory': {'peak_traced_bytes': peak, 'max_rss_kb': max_rss_kb()}
+    }
+    if name == 'question6':
+        results['professors_stored'] = db["professors"].count_documents({})
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the crawlers against a synthetic local website")
+    parser.add_argument('--crawler', choices=('question5', 'question6', 'both'), default='both')
+    parser.add_argument('--pages', type=int, default=1000, help="pages in the site tree")
+    parser.add_argument('--fan-out', type=int, default=8, help="child pages linked from each page")
+    parser.add_argument('--depth', type=int, default=5, help="levels of the site tree")
+    parser.add_argument('--duplicate-links', type=int, default=4, help="extra links per page to known pages")
+    parser.add_argument('--noise-links', type=int, default=2, help="missing, PDF or external links per page")
+    parser.add_argument('--page-bytes', type=int, default=8000, help="approximate size of each page")
+    parser.add_argument('--professors', type=int, default=40, help="profiles on the faculty page")
+    parser.add_argument('--target-depth', type=int, help="tree level of the faculty page's parent (default: deepest)")
+    parser.add_argument('--latency', type=float, default=0.01, help="server delay per request, in seconds")
+    parser.add_argument('--in-flight', type=int, default=16, help="question5 concurrent requests")
+    parser.add_argument('--per-host', type=int, default=4, help="question5 connections to the host")
+    parser.add_argument('--delay', type=float, default=0.0, help="question5 seconds between request starts")
+    parser.add_argument('--window', type=int, default=16, help="question5 URLs fetched ahead")
+    parser.add_argument('--parser', choices=('stream', 'bs4'), default='stream')
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--no-compress', action='store_true')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="also report the peak of Python allocations (tracemalloc slows the crawl)")
+    parser.add_argument('--verbose', action='store_true', help="show the crawlers' own output on stderr")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write JSON results here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    site, target_path, target_level = generate_site(args.pages, args.fan_out, args.depth, args.duplicate_links,
+                                                    args.noise_links, args.page_bytes, args.professors,
+                                                    args.target_depth, args.seed)
+    server, base_url = start_server(site, args.latency)
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'parameters': vars(args),
+        'site': {
+            'pages': len(site),
+            'bytes': sum(len(html) for html in site.values()),
+            'target': target_path,
+            'target_level': target_level
+        },
+        'crawlers': {}
+    }
+    try:
+        crawlers = ('question5', 'question6') if args.crawler == 'both' else (args.crawler,)
+        for name in crawlers:
+            report['crawlers'][name] = run_crawler(name, base_url, args)
+    finally:
+        server.terminate()
+        server.join()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
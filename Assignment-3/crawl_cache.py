@@ -0,0 +1,122 @@
+import re
+import json
+import time
+import zlib
+import sqlite3
+from crawl_fetcher import Response
+
+MAX_AGE = re.compile(r'max-age\s*=\s*(\d+)')
+
+
+class FetchCache:
+    """Local HTTP cache keyed by URL, kept in an SQLite file
+
+    Stores each successful response's body (compressed) and headers with
+    the time it was fetched. A cached page younger than its freshness
+    lifetime is served without any request. An older one is revalidated
+    with If-None-Match / If-Modified-Since, and a 304 answer is served from
+    the cache. The lifetime is `max_age` seconds, or the response's own
+    Cache-Control max-age when `honor_cache_control` is set; with
+    Cache-Control no-cache the page is always revalidated and with
+    no-store it is not cached.
+    """
+
+    def __init__(self, path, max_age=3600.0, honor_cache_control=True):
+        self.max_age = max_age
+        self.honor_cache_control = honor_cache_control
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS pages ("
+                        "url TEXT PRIMARY KEY, status INTEGER, headers TEXT, body BLOB, fetched_at REAL)")
+        self.stats = {'lookups': 0, 'fresh_hits': 0, 'revalidated': 0, 'misses': 0,
+                      'bytes_transferred': 0, 'bytes_from_cache': 0}
+
+    def _entry(self, url):
+        row = self.db.execute("SELECT status, headers, body, fetched_at FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        status, headers, body, fetched_at = row
+        return Response(url, status, json.loads(headers), zlib.decompress(body), None), fetched_at
+
+    def _lifetime(self, headers):
+        cache_control = headers.get('cache-control', '').lower()
+        if self.honor_cache_control:
+            if 'no-cache' in cache_control:
+                return 0.0
+            match = MAX_AGE.search(cache_control)
+            if match:
+                return float(match.group(1))
+        return self.max_age
+
+    def get(self, url):
+        """Return the cached response if it is still fresh, otherwise None"""
+        self.stats['lookups'] += 1
+        entry = self._entry(url)
+        if entry is not None:
+            response, fetched_at = entry
+            if time.time() - fetched_at < self._lifetime(response.headers):
+                self.stats['fresh_hits'] += 1
+                self.stats['bytes_from_cache'] += len(response.body)
+                return response
+        return None
+
+    def request_headers(self, url):
+        """Conditional request headers for revalidating a cached page"""
+        entry = self._entry(url)
+        if entry is None:
+            return {}
+        headers = {}
+        if 'etag' in entry[0].headers:
+            headers['If-None-Match'] = entry[0].headers['etag']
+        if 'last-modified' in entry[0].headers:
+            headers['If-Modified-Since'] = entry[0].headers['last-modified']
+        return headers
+
+    def update(self, url, response):
+        """Record a network response and return the response to use
+
+        A 304 returns the cached page (and restarts its lifetime), a 200
+        is stored and returned, anything else is returned as is.
+        """
+        self.stats['bytes_transferred'] += len(response.body)
+        if response.status == 304:
+            entry = self._entry(url)
+            if entry is not None:
+                self.stats['revalidated'] += 1
+                self.stats['bytes_from_cache'] += len(entry[0].body)
+                with self.db:
+                    self.db.execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+                return entry[0]
+        self.stats['misses'] += 1
+        if response.status == 200 and 'no-store' not in response.headers.get('cache-control', '').lower():
+            with self.db:
+                self.db.execute("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                                (url, response.status, json.dumps(response.headers),
+                                 zlib.compress(response.body), time.time()))
+        return response
+
+    def report(self):
+        hits = self.stats['fresh_hits'] + self.stats['revalidated']
+        rate = hits / self.stats['lookups'] if self.stats['lookups'] else 0.0
+        return (f"Fetch cache: {self.stats['lookups']} lookups, {rate:.1%} hit rate "
+                f"({self.stats['fresh_hits']} fresh, {self.stats['revalidated']} revalidated, "
+                f"{self.stats['misses']} fetched), {self.stats['bytes_transferred']} bytes transferred, "
+                f"{self.stats['bytes_from_cache']} bytes served from cache")
+
+    def close(self):
+        self.db.close()
+
+
+class CachingFetcher:
+    """Fetcher wrapper that answers from a FetchCache and revalidates stale pages"""
+
+    def __init__(self, fetcher, cache):
+        self.fetcher = fetcher
+        self.cache = cache
+
+    async def fetch(self, url, headers=None):
+        cached = self.cache.get(url)
+        if cached is not None:
+            return cached
+        request_headers = dict(headers or {})
+        request_headers.update(self.cache.request_headers(url))
+        return self.cache.update(url, await self.fetcher.fetch(url, request_headers))
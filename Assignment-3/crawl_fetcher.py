@@ -0,0 +1,165 @@
+import time
+import asyncio
+import http.client
+import threading
+import urllib.parse
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Result of one fetch: final URL after redirects, status (None if the request failed),
+# lowercased response headers, body bytes and the error message, if any
+Response = namedtuple('Response', ['url', 'status', 'headers', 'body', 'error'])
+
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+
+class HostPool:
+    """Keep-alive connections to one host, plus its concurrency and rate limits"""
+
+    def __init__(self, scheme, netloc, max_connections, delay, timeout):
+        self.scheme = scheme
+        self.netloc = netloc
+        self.timeout = timeout
+        self.delay = delay
+        self.idle = []
+        self.lock = threading.Lock()
+        self.slots = None
+        self.rate_lock = None
+        self.next_start = 0.0
+        self.max_connections = max_connections
+
+    async def wait_turn(self):
+        # Space request starts to this host at least `delay` seconds apart
+        if self.rate_lock is None:
+            self.rate_lock = asyncio.Lock()
+        async with self.rate_lock:
+            now = time.monotonic()
+            if now < self.next_start:
+                await asyncio.sleep(self.next_start - now)
+            self.next_start = max(now, self.next_start) + self.delay
+
+    def connection(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(self.netloc, timeout=self.timeout)
+
+    def release(self, connection):
+        with self.lock:
+            self.idle.append(connection)
+
+    def close(self):
+        with self.lock:
+            for connection in self.idle:
+                connection.close()
+            self.idle.clear()
+
+
+class Fetcher:
+    """Concurrent HTTP fetcher with per-host connection reuse and politeness
+
+    At most `max_in_flight` requests run at once (on worker threads using
+    http.client), at most `max_per_host` of them against any one host, and
+    requests to one host start at least `delay` seconds apart.
+    """
+
+    def __init__(self, max_in_flight=16, max_per_host=4, delay=0.1, timeout=10.0,
+                 user_agent='cs5180-crawler', max_redirects=5):
+        self.max_in_flight = max_in_flight
+        self.max_per_host = max_per_host
+        self.delay = delay
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.max_redirects = max_redirects
+        self.hosts = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix='fetch')
+
+    def _host(self, scheme, netloc):
+        key = (scheme, netloc)
+        if key not in self.hosts:
+            self.hosts[key] = HostPool(scheme, netloc, self.max_per_host, self.delay, self.timeout)
+        return self.hosts[key]
+
+    async def fetch(self, url, headers=None):
+        """Fetch a URL, following redirects; network errors are returned, not raised"""
+        loop = asyncio.get_running_loop()
+        for _ in range(self.max_redirects + 1):
+            parts = urllib.parse.urlsplit(url)
+            if parts.scheme not in ('http', 'https'):
+                return Response(url, None, {}, b'', f"unsupported scheme: {parts.scheme}")
+            host = self._host(parts.scheme, parts.netloc)
+            if host.slots is None:
+                host.slots = asyncio.Semaphore(host.max_connections)
+            async with host.slots:
+                await host.wait_turn()
+                response = await loop.run_in_executor(self._executor, self._request, host, parts, headers)
+            if response.status in REDIRECT_STATUSES and 'location' in response.headers:
+                url = urllib.parse.urljoin(url, response.headers['location'])
+                continue
+            return response
+        return Response(url, None, {}, b'', "too many redirects")
+
+    def _request(self, host, parts, headers):
+        path = urllib.parse.urlunsplit(('', '', parts.path or '/', parts.query, ''))
+        request_headers = {'User-Agent': self.user_agent, 'Connection': 'keep-alive'}
+        request_headers.update(headers or {})
+        url = urllib.parse.urlunsplit(parts)
+        # A pooled connection may have been closed by the server while idle; retry once on a fresh one
+        for attempt in range(2):
+            connection = host.connection()
+            try:
+                connection.request('GET', path, headers=request_headers)
+                response = connection.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                if attempt == 0 and isinstance(e, (http.client.RemoteDisconnected, ConnectionResetError,
+                                                   BrokenPipeError)):
+                    continue
+                return Response(url, None, {}, b'', f"{type(e).__name__}: {e}")
+            if response.will_close:
+                connection.close()
+            else:
+                host.release(connection)
+            return Response(url, response.status, {k.lower(): v for k, v in response.getheaders()}, body, None)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for host in self.hosts.values():
+            host.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+async def fetch_in_order(fetcher, next_url, window=16):
+    """Yield (url, response) in exactly the order `next_url` hands out URLs
+
+    Up to `window` URLs are fetched ahead concurrently, but results are
+    yielded in order, so a breadth-first crawl that pops its frontier in
+    `next_url` processes pages in the same order as a serial crawl. Links
+    found on a page can still be appended before later URLs are requested,
+    since `next_url` is only called to refill the window. `next_url`
+    returns None when nothing is queued right now. Stopping the iteration
+    (e.g. once a target page is found) cancels the fetches still pending.
+    """
+    pending = deque()
+    try:
+        while True:
+            while len(pending) < window:
+                url = next_url()
+                if url is None:
+                    break
+                pending.append((url, asyncio.ensure_future(fetcher.fetch(url))))
+            if not pending:
+                return
+            url, task = pending.popleft()
+            yield url, await task
+    finally:
+        for _, task in pending:
+            task.cancel()
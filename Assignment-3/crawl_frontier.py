@@ -0,0 +1,154 @@
+import os
+import tempfile
+import urllib.parse
+from collections import deque
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def canonicalize_url(url):
+    """Normalize a URL so that equivalent spellings compare equal
+
+    Lowercases the scheme and host, drops default ports and the fragment,
+    treats an empty path as "/", removes a trailing slash from other
+    paths and sorts the query parameters.
+    """
+    parts = urllib.parse.urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port is None or port == DEFAULT_PORTS.get(scheme) else f"{host}:{port}"
+    path = parts.path or '/'
+    if len(path) > 1 and path.endswith('/'):
+        path = path.rstrip('/') or '/'
+    query = urllib.parse.urlencode(sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)))
+    return urllib.parse.urlunsplit((scheme, netloc, path, query, ''))
+
+
+class Frontier:
+    """Breadth-first crawl frontier with O(1) push/pop and deduplication
+
+    Every URL is queued at most once: `seen` holds the canonical form of
+    every URL ever pushed, queued or visited. URLs are queued as given,
+    minus their fragment, so the first spelling found is the one fetched.
+
+    With a `path`, every push and finished URL is appended to a journal
+    file. Reopening the same path resumes the crawl: visited URLs are not
+    fetched again and URLs that were queued or in flight are queued again
+    in their original order. The journal is flushed every `sync_every`
+    records, so a crash loses at most that many records.
+    """
+
+    def __init__(self, path=None, sync_every=100):
+        self.queue = deque()
+        self.seen = set()
+        self.path = path
+        self.sync_every = sync_every
+        self._journal = None
+        self._unsynced = 0
+        if path is not None:
+            self._load()
+
+    def _load(self):
+        pushed = []
+        done = set()
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    op, _, url = line.rstrip('\n').partition('\t')
+                    if op == '+':
+                        pushed.append(url)
+                    elif op == '=':
+                        # Finished before an earlier compaction; kept finished through every later one
+                        key = canonicalize_url(url)
+                        self.seen.add(key)
+                        done.add(key)
+                    elif op == '-':
+                        done.add(canonicalize_url(url))
+        for url in pushed:
+            key = canonicalize_url(url)
+            if key not in self.seen:
+                self.seen.add(key)
+                if key not in done:
+                    self.queue.append(url)
+        done &= self.seen
+
+        # Compact the journal: finished URLs as '=', still queued ones as '+'
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            for key in done:
+                f.write(f"=\t{key}\n")
+            for url in self.queue:
+                f.write(f"+\t{url}\n")
+        os.replace(tmp, self.path)
+        self._journal = open(self.path, 'a', encoding='utf-8')
+
+    def _record(self, op, url):
+        if self._journal is None:
+            return
+        self._journal.write(f"{op}\t{url}\n")
+        self._unsynced += 1
+        if self._unsynced >= self.sync_every:
+            self.flush()
+
+    def push(self, url):
+        """Queue a URL unless an equivalent one was already pushed; returns whether it was queued"""
+        url = urllib.parse.urldefrag(url)[0]
+        key = canonicalize_url(url)
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        self.queue.append(url)
+        self._record('+', url)
+        return True
+
+    def pop(self):
+        """Return the next URL to fetch, or None if nothing is queued"""
+        return self.queue.popleft() if self.queue else None
+
+    def done(self, *urls):
+        """Record that popped URLs were processed, so a resumed crawl skips them"""
+        for url in urls:
+            self._record('-', url)
+
+    def __contains__(self, url):
+        return canonicalize_url(url) in self.seen
+
+    def __len__(self):
+        return len(self.queue)
+
+    def flush(self):
+        if self._journal is not None:
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._unsynced = 0
+
+    def close(self):
+        if self._journal is not None:
+            self.flush()
+            self._journal.close()
+            self._journal = None
+
+
+def check_resume(resumes=3):
+    """Resume a journaled frontier `resumes` times, finishing one new URL per run
+
+    Fails if a URL finished in any earlier run is queued again.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'frontier.journal')
+        for i in range(resumes + 1):
+            frontier = Frontier(path)
+            for j in range(i):
+                assert not frontier.push(f"http://x/{j}"), f"resume {i}: http://x/{j} queued again"
+            assert frontier.push(f"http://x/{i}")
+            frontier.done(frontier.pop())
+            assert frontier.pop() is None
+            frontier.close()
+    print(f"Frontier resumed {resumes} times without requeueing finished URLs")
+
+if __name__ == "__main__":
+    check_resume()
@@ -0,0 +1,188 @@
+import sys
+import json
+import time
+import pstats
+import cProfile
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the timing histogram buckets: from 10us, four per doubling (~19% apart)
+# up to ~170s, then overflow
+BUCKETS = [0.00001 * 2 ** (i / 4) for i in range(97)]
+
+
+class Histogram:
+    """Fixed log-scale histogram of durations, with count, total, min and max"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def percentile(self, p):
+        # Upper bound of the bucket holding the p-th percentile (the max for the overflow bucket)
+        if not self.count:
+            return None
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+    def summary(self):
+        ms = lambda s: round(s * 1000, 3) if s is not None else None
+        return {
+            'count': self.count,
+            'total_s': round(self.total, 4),
+            'mean_ms': ms(self.total / self.count) if self.count else None,
+            'min_ms': ms(self.min),
+            'p50_ms': ms(self.percentile(50)),
+            'p90_ms': ms(self.percentile(90)),
+            'p99_ms': ms(self.percentile(99)),
+            'max_ms': ms(self.max)
+        }
+
+
+class CrawlMetrics:
+    """Per-stage timings and counters of one crawl
+
+    Each stage (fetch, parse, store, professors, ...) gets a timing
+    histogram; pages, bytes fetched, frontier depth and errors by type are
+    counted alongside. With `log_every` set, `tick()` writes a snapshot as
+    one JSON line to `log` at most that often; `report()` is the
+    end-of-run summary.
+    """
+
+    def __init__(self, log_every=None, log=None):
+        self.log_every = log_every
+        self.log = log or sys.stderr
+        self.started = time.perf_counter()
+        self.last_log = self.started
+        self.stages = {}
+        self.errors = {}
+        self.pages = 0
+        self.bytes_fetched = 0
+        self.frontier_depth = 0
+        self.max_frontier_depth = 0
+
+    @contextmanager
+    def stage(self, name):
+        """Time the enclosed block into the `name` histogram"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        if name not in self.stages:
+            self.stages[name] = Histogram()
+        self.stages[name].add(seconds)
+
+    def fetched(self, nbytes):
+        self.pages += 1
+        self.bytes_fetched += nbytes
+
+    def error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def frontier(self, depth):
+        self.frontier_depth = depth
+        self.max_frontier_depth = max(self.max_frontier_depth, depth)
+
+    def tick(self):
+        """Write a snapshot if `log_every` seconds have passed since the last one"""
+        if self.log_every and time.perf_counter() - self.last_log >= self.log_every:
+            self.write_snapshot()
+
+    def write_snapshot(self, event='progress'):
+        self.last_log = time.perf_counter()
+        print(json.dumps(dict(self.snapshot(), event=event)), file=self.log, flush=True)
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'pages': self.pages,
+            'pages_per_sec': round(self.pages / elapsed, 2) if elapsed > 0 else 0.0,
+            'bytes_fetched': self.bytes_fetched,
+            'frontier_depth': self.frontier_depth,
+            'max_frontier_depth': self.max_frontier_depth,
+            'errors': dict(self.errors),
+            'stages': {name: histogram.summary() for name, histogram in self.stages.items()}
+        }
+
+    def report(self):
+        snapshot = self.snapshot()
+        lines = [f"Crawled {snapshot['pages']} pages ({snapshot['bytes_fetched']} bytes) in {snapshot['elapsed_s']:.2f}s, "
+                 f"{snapshot['pages_per_sec']:.1f} pages/sec, frontier depth {snapshot['frontier_depth']} "
+                 f"(max {snapshot['max_frontier_depth']})"]
+        for name, stage in snapshot['stages'].items():
+            share = stage['total_s'] / snapshot['elapsed_s'] if snapshot['elapsed_s'] else 0.0
+            lines.append(f"  {name:<11} {stage['count']:>6} calls  {stage['total_s']:>8.3f}s ({share:.0%})  "
+                         f"p50 {stage['p50_ms']}ms  p90 {stage['p90_ms']}ms  max {stage['max_ms']}ms")
+        if snapshot['errors']:
+            lines.append("  errors: " + ", ".join(f"{kind} x{n}" for kind, n in sorted(snapshot['errors'].items())))
+        return "\n".join(lines)
+
+
+class TimedFetcher:
+    """Fetcher wrapper that times each fetch and counts bytes and errors into CrawlMetrics
+
+    Fetches overlap, so the `fetch` stage total can exceed wall time; the
+    `fetch_wait` stage of the crawl loop shows how long it actually blocked.
+    """
+
+    def __init__(self, fetcher, metrics):
+        self.fetcher = fetcher
+        self.metrics = metrics
+
+    async def fetch(self, url, headers=None):
+        with self.metrics.stage('fetch'):
+            response = await self.fetcher.fetch(url, headers)
+        if response.error is not None:
+            self.metrics.error(error_kind(response.error))
+        elif response.status >= 400:
+            self.metrics.error(f"HTTP {response.status}")
+        else:
+            self.metrics.fetched(len(response.body))
+        return response
+
+
+def error_kind(error):
+    """Error type of an exception, or of a fetcher error message ("ExceptionName: message")"""
+    if isinstance(error, BaseException):
+        if hasattr(error, 'code'):
+            return f"HTTP {error.code}"
+        return type(error).__name__
+    return error.split(':', 1)[0]
+
+
+@contextmanager
+def profiled(path=None, top=25):
+    """Run the enclosed block under cProfile
+
+    Stats are written to `path` (for pstats/snakeviz) if given, and the
+    `top` functions by cumulative time are printed. Only the calling
+    thread is profiled, not fetcher worker threads.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        if path:
+            profiler.dump_stats(path)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(top)
@@ -0,0 +1,141 @@
+import sys
+import time
+import argparse
+import urllib.parse
+from html.parser import HTMLParser
+from collections import namedtuple
+from bs4 import BeautifulSoup
+
+# What the crawlers need from one page: its absolute link URLs in document order,
+# and whether it is the target page (a cpp-h1 heading exists and the first <h1> contains the text)
+ParsedPage = namedtuple('ParsedPage', ['links', 'is_target'])
+
+
+class LinkExtractor(HTMLParser):
+    """Streaming, non-DOM extractor of <a href> links and the target-page signal
+
+    Handles tags as they are read without building a tree, which is much
+    faster than BeautifulSoup for pages that only need their links.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.hrefs = []
+        self.has_cpp_h1 = False
+        self.first_h1 = None
+        self._h1_depth = 0
+        self._h1_text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            for name, value in attrs:
+                if name == 'href':
+                    self.hrefs.append(value or '')
+                    break
+        elif tag == 'h1':
+            for name, value in attrs:
+                if name == 'class' and 'cpp-h1' in (value or '').split():
+                    self.has_cpp_h1 = True
+            if self.first_h1 is None:
+                self._h1_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag == 'h1' and self._h1_depth:
+            self._h1_depth -= 1
+            if not self._h1_depth:
+                self.first_h1 = ''.join(self._h1_text)
+
+    def handle_data(self, data):
+        if self._h1_depth:
+            self._h1_text.append(data)
+
+    def close(self):
+        super().close()
+        # An <h1> left open runs to the end of the document
+        if self._h1_depth and self.first_h1 is None:
+            self.first_h1 = ''.join(self._h1_text)
+
+
+def parse_page(html, base_url, heading=None, parser='stream'):
+    """Extract links (resolved against base_url) and the target signal in one parse
+
+    `parser` is 'stream' for LinkExtractor or 'bs4' for one BeautifulSoup
+    tree. Without a `heading`, is_target is always False.
+    """
+    if parser == 'bs4':
+        soup = BeautifulSoup(html, 'html.parser')
+        hrefs = [link["href"] for link in soup.find_all("a", href=True)]
+        is_target = bool(heading and soup.find("h1", class_="cpp-h1") and heading in soup.h1.text)
+    elif parser == 'stream':
+        extractor = LinkExtractor()
+        extractor.feed(html.decode('utf-8', errors='replace') if isinstance(html, bytes) else html)
+        extractor.close()
+        hrefs = extractor.hrefs
+        is_target = bool(heading and extractor.has_cpp_h1 and heading in (extractor.first_h1 or ''))
+    else:
+        raise ValueError(f"Unknown parser: {parser}")
+    return ParsedPage([urllib.parse.urljoin(base_url, href) for href in hrefs], is_target)
+
+
+def parse_twice(html, base_url, heading):
+    # The crawlers' original path: one soup for the target check and another for the links
+    soup = BeautifulSoup(html, 'html.parser')
+    is_target = bool(soup.find("h1", class_="cpp-h1") and heading in soup.h1.text)
+    soup = BeautifulSoup(html, 'html.parser')
+    links = [urllib.parse.urljoin(base_url, link["href"]) for link in soup.find_all("a", href=True)]
+    return ParsedPage(links, is_target)
+
+
+def benchmark_parsers(pages, heading='Permanent Faculty'):
+    """Time each parse path over (url, html) pages; returns pages/sec and whether results match"""
+    paths = {
+        'bs4 (two parses)': lambda html, url: parse_twice(html, url, heading),
+        'bs4': lambda html, url: parse_page(html, url, heading, 'bs4'),
+        'stream': lambda html, url: parse_page(html, url, heading, 'stream')
+    }
+    report = {}
+    reference = None
+    for name, parse in paths.items():
+        started = time.perf_counter()
+        results = [parse(html, url) for url, html in pages]
+        elapsed = time.perf_counter() - started
+        if reference is None:
+            reference = results
+        report[name] = {
+            'pages': len(pages),
+            'seconds': round(elapsed, 4),
+            'pages_per_sec': round(len(pages) / elapsed, 1) if elapsed > 0 else 0.0,
+            'same_as_original': results == reference
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare parse throughput over stored crawl pages or HTML files")
+    parser.add_argument("files", nargs='*', help="HTML files (default: the pages collection)")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--limit", type=int, default=1000, help="pages read from MongoDB")
+    parser.add_argument("--heading", default="Permanent Faculty")
+    args = parser.parse_args()
+
+    if args.files:
+        pages = []
+        for path in args.files:
+            with open(path, 'rb') as f:
+                pages.append(('file://' + urllib.parse.quote(path), f.read()))
+    else:
+        from pymongo import MongoClient
+        from crawl_storage import page_html
+        pages_collection = MongoClient(args.mongo_uri)["assignment"]["pages"]
+        pages = [(page['url'], page_html(page).encode('utf-8'))
+                 for page in pages_collection.find({'duplicate_of': None}).limit(args.limit)]
+    if not pages:
+        sys.exit("No pages to parse")
+
+    for name, result in benchmark_parsers(pages, args.heading).items():
+        print(f"{name:<18} {result['pages_per_sec']:>10.1f} pages/sec  "
+              f"({result['pages']} pages in {result['seconds']:.3f}s, same links/target: {result['same_as_original']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+import time
+import argparse
+from multiprocessing import Pool
+from bs4 import BeautifulSoup
+from bs4.element import NavigableString, PreformattedString, CData
+from pymongo import ASCENDING, UpdateOne
+from crawl_storage import page_html
+
+LABELS = ('Title:', 'Office:', 'Phone:', 'Email:')
+INCOMPLETE_PHONE = "(909) 869-"
+
+
+class ProfileWalker:
+    """Collects every field signal of one profile block in a single walk over its nodes
+
+    Records, in document order, the first <h2>, the first <strong> whose
+    string holds each label, the first mailto link, the first link whose
+    string mentions "Web:"/"Website", and the text and first non-mailto
+    link of every <p>. `fields()` then applies the same precedence as the
+    original multi-pass extraction.
+    """
+
+    def __init__(self):
+        self.name = None
+        self.strong_values = {}
+        self.mailto = None
+        self.web_link = None
+        self.paragraphs = []
+        self._open_paragraphs = []
+
+    def walk(self, node):
+        for child in node.children:
+            if isinstance(child, NavigableString):
+                # Same strings as get_text(): no comments, doctypes or other markup
+                if not isinstance(child, PreformattedString) or isinstance(child, CData):
+                    for paragraph in self._open_paragraphs:
+                        paragraph['text'].append(str(child))
+                continue
+
+            if child.name == 'h2' and self.name is None:
+                self.name = child.get_text(strip=True)
+            elif child.name == 'strong':
+                string = child.string
+                for label in LABELS[:3]:
+                    if string and label in string and label not in self.strong_values:
+                        sibling = child.next_sibling
+                        self.strong_values[label] = sibling.strip() if isinstance(sibling, NavigableString) else None
+            elif child.name == 'a':
+                href = child.get('href')
+                if self.mailto is None and href and 'mailto:' in href:
+                    self.mailto = child
+                string = child.string
+                if self.web_link is None and string and ('Web:' in string or 'Website' in string):
+                    self.web_link = child
+                if href and 'mailto:' not in href:
+                    for paragraph in self._open_paragraphs:
+                        if paragraph['link'] is None:
+                            paragraph['link'] = href
+
+            if child.name == 'p':
+                paragraph = {'text': [], 'link': None}
+                self.paragraphs.append(paragraph)
+                self._open_paragraphs.append(paragraph)
+                self.walk(child)
+                self._open_paragraphs.pop()
+            else:
+                self.walk(child)
+
+    def _after_label(self, label):
+        # Text after the label in the first paragraph that contains it
+        for paragraph in self.paragraphs:
+            text = ''.join(paragraph['text'])
+            if label in text:
+                return text.split(label)[1].strip()
+        return None
+
+    def fields(self):
+        title = self.strong_values.get('Title:') or self._after_label('Title:')
+        office = self.strong_values.get('Office:') or self._after_label('Office:')
+
+        phone = self.strong_values.get('Phone:')
+        if not phone:
+            phone = self._after_label('Phone:')
+            # Clean up incomplete phone numbers
+            if phone and phone.strip() == INCOMPLETE_PHONE:
+                phone = None
+
+        email = None
+        if self.mailto is not None:
+            email = self.mailto.get_text(strip=True) or self.mailto['href'].replace("mailto:", "")
+        if not email:
+            email = self._after_label('Email:')
+
+        website = None
+        if self.web_link is not None and "mailto:" not in self.web_link.get("href", ""):
+            website = self.web_link.get("href")
+        if not website:
+            for paragraph in self.paragraphs:
+                text = ''.join(paragraph['text'])
+                if ("Website:" in text or "Web:" in text) and paragraph['link']:
+                    website = paragraph['link']
+                    break
+
+        return {
+            "name": self.name,
+            "title": title,
+            "office": office,
+            "phone": phone,
+            "email": email,
+            "website": website
+        }
+
+
+def extract_professors(html):
+    """Return the professor records of a faculty page, one per div.clearfix block"""
+    soup = BeautifulSoup(html, 'html.parser')
+    professors = []
+    for professor_info in soup.find_all("div", class_="clearfix"):
+        walker = ProfileWalker()
+        walker.walk(professor_info)
+        professors.append(walker.fields())
+    return professors
+
+
+def store_professors(professors_collection, professors):
+    """Insert professors with a name and email not stored yet, in one unordered bulk upsert
+
+    Returns the records that were new.
+    """
+    ops = []
+    new = []
+    for professor_data in professors:
+        # Only insert if we have at least name and email
+        if professor_data["name"] and professor_data["email"]:
+            key = {"name": professor_data["name"], "email": professor_data["email"]}
+            ops.append(UpdateOne(key, {"$setOnInsert": professor_data}, upsert=True))
+            new.append(professor_data)
+    if not ops:
+        return []
+    result = professors_collection.bulk_write(ops, ordered=False)
+    return [new[i] for i in result.upserted_ids]
+
+
+def _extract_page(page):
+    url, html = page
+    return url, extract_professors(html)
+
+
+def parse_pages(pages_collection, professors_collection, query=None, workers=4, chunk_size=8):
+    """Parse stored pages in a process pool and upsert their professors on (name, email)
+
+    Runs separately from the crawl, over any pages already in the pages
+    collection. Returns the number of pages parsed and professors added.
+    """
+    professors_collection.create_index([("name", ASCENDING), ("email", ASCENDING)], unique=True)
+    query = dict(query or {})
+    query.setdefault('duplicate_of', None)
+    pages = ((page['url'], page_html(page)) for page in pages_collection.find(query))
+
+    parsed = 0
+    added = 0
+    if workers > 1:
+        with Pool(workers) as pool:
+            for url, professors in pool.imap(_extract_page, pages, chunksize=chunk_size):
+                parsed += 1
+                added += len(store_professors(professors_collection, professors))
+    else:
+        for url, professors in map(_extract_page, pages):
+            parsed += 1
+            added += len(store_professors(professors_collection, professors))
+    return parsed, added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract professors from stored pages in parallel")
+    parser.add_argument("--url", help="only parse the page stored for this URL")
+    parser.add_argument("--workers", type=int, default=4, help="parser processes (1 parses inline)")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    args = parser.parse_args()
+
+    from pymongo import MongoClient
+    db = MongoClient(args.mongo_uri)["assignment"]
+    started = time.perf_counter()
+    parsed, added = parse_pages(db["pages"], db["professors"], {"url": args.url} if args.url else None, args.workers)
+    elapsed = time.perf_counter() - started
+    print(f"Parsed {parsed} pages in {elapsed:.2f}s with {args.workers} workers, added {added} professors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import zlib
+import hashlib
+from bson.binary import Binary
+from pymongo import ASCENDING, UpdateOne
+
+
+def page_html(page):
+    """Return a stored page's HTML as text, decompressing it if needed
+
+    Works for compressed pages (`html_z`), plain pages (`html`, as the
+    crawlers stored them before) and duplicate stubs (None).
+    """
+    if page.get('html_z') is not None:
+        return zlib.decompress(page['html_z']).decode('utf-8', errors='replace')
+    return page.get('html')
+
+
+class PageStore:
+    """Buffered writer of crawled pages into the `pages` collection
+
+    Pages are written `batch_size` at a time with one unordered bulk
+    upsert keyed on a unique `url` index, so re-crawling a URL replaces
+    its page. Bodies are zlib-compressed into `html_z` unless `compress`
+    is False. A page whose content hash is already stored keeps only a
+    stub: its url, hash and `duplicate_of` (the URL holding the body).
+
+    `on_flush` is called with the URLs of each written batch, e.g. to
+    mark them finished in a resumable frontier only once they are stored.
+    """
+
+    def __init__(self, pages_collection, batch_size=100, compress=True, level=6, on_flush=None):
+        self.pages_collection = pages_collection
+        self.batch_size = batch_size
+        self.compress = compress
+        self.level = level
+        self.on_flush = on_flush
+        self.buffer = []
+        self.hashes = {}
+        self.stats = {'pages': 0, 'duplicates': 0, 'batches': 0, 'html_bytes': 0, 'stored_bytes': 0}
+
+        pages_collection.create_index([('url', ASCENDING)], unique=True)
+        pages_collection.create_index([('content_hash', ASCENDING)])
+
+    def add(self, url, html):
+        """Buffer a page's raw HTML bytes, flushing when the batch is full"""
+        self.buffer.append((url, html))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        batch, self.buffer = self.buffer, []
+
+        # Look up every new hash of the batch in one query
+        hashes = [hashlib.sha256(html).hexdigest() for _, html in batch]
+        unknown = list({h for h in hashes if h not in self.hashes})
+        if unknown:
+            for page in self.pages_collection.find({'content_hash': {'$in': unknown}, 'duplicate_of': None},
+                                                   {'url': 1, 'content_hash': 1}):
+                self.hashes.setdefault(page['content_hash'], page['url'])
+
+        ops = []
+        for (url, html), content_hash in zip(batch, hashes):
+            page = {'url': url, 'content_hash': content_hash, 'length': len(html)}
+            original = self.hashes.get(content_hash)
+            if original is not None and original != url:
+                page.update({'duplicate_of': original, 'html': None, 'html_z': None})
+                self.stats['duplicates'] += 1
+            else:
+                self.hashes[content_hash] = url
+                if self.compress:
+                    body = Binary(zlib.compress(html, self.level))
+                    page.update({'duplicate_of': None, 'html': None, 'html_z': body})
+                else:
+                    body = html.decode('utf-8')
+                    page.update({'duplicate_of': None, 'html': body, 'html_z': None})
+                self.stats['stored_bytes'] += len(body)
+            self.stats['html_bytes'] += len(html)
+            ops.append(UpdateOne({'url': url}, {'$set': page}, upsert=True))
+
+        self.pages_collection.bulk_write(ops, ordered=False)
+        self.stats['pages'] += len(batch)
+        self.stats['batches'] += 1
+        if self.on_flush is not None:
+            self.on_flush([url for url, _ in batch])
+
+    def get(self, url):
+        """Return the HTML stored for a URL (following duplicate stubs), or None"""
+        page = self.pages_collection.find_one({'url': url})
+        if page is not None and page.get('duplicate_of'):
+            page = self.pages_collection.find_one({'url': page['duplicate_of']})
+        return page_html(page) if page is not None else None
+
+    def close(self):
+        self.flush()
@@ -1,58 +1,138 @@
-import urllib.parse
-import urllib.request
-from bs4 import BeautifulSoup
+import time
+import asyncio
+import argparse
 from pymongo import MongoClient
-
-# MongoDB setup
-client = MongoClient("mongodb://localhost:27017/")
-db = client["assignment"]
-pages_collection = db["pages"]
+from crawl_fetcher import Fetcher, fetch_in_order
+from crawl_frontier import Frontier
+from crawl_parser import parse_page
+from crawl_storage import PageStore
+from crawl_cache import FetchCache, CachingFetcher
+from crawl_metrics import CrawlMetrics, TimedFetcher, profiled
 
 # Initialize frontier with the CS home page URL
-frontier = ["https://www.cpp.edu/sci/computer-science/"]
-visited = set()
+start_url = "https://www.cpp.edu/sci/computer-science/"
 target_url = "https://www.cpp.edu/sci/computer-science/faculty-and-staff/permanent-faculty.shtml"
+allowed_prefix = "https://www.cpp.edu"
+target_heading = "Permanent Faculty"
 
-# Function to retrieve and parse HTML content
-def retrieve_html(url):
-    try:
-        response = urllib.request.urlopen(url)
-        if "html" in response.getheader("Content-Type"):
-            return response.read()
-    except Exception as e:
-        print(f"Failed to retrieve {url}: {e}")
+# Function to retrieve and parse HTML content from a fetch response
+def retrieve_html(url, response):
+    if response.error is not None:
+        print(f"Failed to retrieve {url}: {response.error}")
+    elif response.status >= 400:
+        print(f"Failed to retrieve {url}: HTTP Error {response.status}")
+    elif "html" in response.headers.get("content-type", ""):
+        return response.body
     return None
 
-# Function to store the page content in MongoDB
-def store_page(url, html):
-    if html:
-        pages_collection.insert_one({"url": url, "html": html.decode("utf-8")})
-
 # Check if the target page is found
-def is_target_page(html):
-    soup = BeautifulSoup(html, 'html.parser')
-    return soup.find("h1", class_="cpp-h1") and "Permanent Faculty" in soup.h1.text
-
-# Main crawling loop
-while frontier:
-    url = frontier.pop(0)
-    if url in visited:
-        continue
-    visited.add(url)
-    
-    html = retrieve_html(url)
-    if not html:
-        continue
-    
-    store_page(url, html)
-    
-    if is_target_page(html):
-        print(f"Target page found: {url}")
-        break
-    
-    # Parse and add unvisited URLs to the frontier
-    soup = BeautifulSoup(html, 'html.parser')
-    for link in soup.find_all("a", href=True):
-        link_url = urllib.parse.urljoin(url, link["href"])
-        if link_url.startswith("https://www.cpp.edu") and link_url not in visited:
-            frontier.append(link_url)
+def is_target_page(html, heading=target_heading):
+    return parse_page(html, "", heading).is_target
+
+# Main crawling loop: pages are fetched concurrently but processed in breadth-first order.
+# With state_path the frontier is journaled there, and rerunning with the same path resumes the crawl.
+# Pages are written in batches, and only count as finished for the frontier once their batch is stored.
+# Each stage is timed into `metrics` (a CrawlMetrics), whose summary is printed at the end
+async def crawl(pages_collection, start_url=start_url, allowed_prefix=allowed_prefix, heading=target_heading,
+                max_in_flight=16, max_per_host=4, delay=0.1, window=16, state_path=None, parser='stream',
+                batch_size=100, compress=True, cache_path=None, max_age=3600.0, metrics=None):
+    metrics = metrics or CrawlMetrics()
+    frontier = Frontier(state_path)
+    cache = FetchCache(cache_path, max_age) if cache_path else None
+    store = PageStore(pages_collection, batch_size, compress, on_flush=lambda urls: frontier.done(*urls))
+    if not frontier.seen:
+        frontier.push(start_url)
+
+    try:
+        async with Fetcher(max_in_flight=max_in_flight, max_per_host=max_per_host, delay=delay) as fetcher:
+            # With a cache, fresh pages are not requested and stale ones are revalidated
+            if cache is not None:
+                fetcher = CachingFetcher(fetcher, cache)
+            fetcher = TimedFetcher(fetcher, metrics)
+            # fetch_wait is how long processing blocked on the next page in order
+            waited = time.perf_counter()
+            async for url, response in fetch_in_order(fetcher, frontier.pop, window):
+                metrics.record('fetch_wait', time.perf_counter() - waited)
+                metrics.frontier(len(frontier))
+                metrics.tick()
+                html = retrieve_html(url, response)
+                if not html:
+                    frontier.done(url)
+                    waited = time.perf_counter()
+                    continue
+
+                with metrics.stage('store'):
+                    store.add(url, html)
+
+                # One parse yields both the target check and the links
+                with metrics.stage('parse'):
+                    page = parse_page(html, url, heading, parser)
+
+                if page.is_target:
+                    print(f"Target page found: {url}")
+                    return url
+
+                # Add new URLs to the frontier
+                for link_url in page.links:
+                    if link_url.startswith(allowed_prefix):
+                        frontier.push(link_url)
+                waited = time.perf_counter()
+        return None
+    finally:
+        with metrics.stage('store'):
+            store.close()
+        frontier.close()
+        if cache is not None:
+            print(cache.report())
+            cache.close()
+        if metrics.log_every:
+            metrics.write_snapshot('end')
+        print(metrics.report())
+
+def main():
+    parser = argparse.ArgumentParser(description="Breadth-first crawl until the target page is found")
+    parser.add_argument("--start-url", default=start_url)
+    parser.add_argument("--prefix", default=allowed_prefix, help="only follow links starting with this")
+    parser.add_argument("--heading", default=target_heading, help="text of the target page's cpp-h1 heading")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--in-flight", type=int, default=16, help="concurrent requests")
+    parser.add_argument("--per-host", type=int, default=4, help="concurrent connections per host")
+    parser.add_argument("--delay", type=float, default=0.1, help="seconds between request starts per host")
+    parser.add_argument("--window", type=int, default=16, help="frontier URLs fetched ahead of processing")
+    parser.add_argument("--state", help="frontier journal file; rerun with the same file to resume a crawl")
+    parser.add_argument("--parser", choices=("stream", "bs4"), default="stream",
+                        help="streaming link extractor or one BeautifulSoup parse per page")
+    parser.add_argument("--batch-size", type=int, default=100, help="pages per bulk write")
+    parser.add_argument("--no-compress", action="store_true", help="store HTML as plain text")
+    parser.add_argument("--cache", help="SQLite fetch cache file; re-crawls only refetch changed pages")
+    parser.add_argument("--max-age", type=float, default=3600.0,
+                        help="seconds a cached page is used without revalidation (unless Cache-Control says otherwise)")
+    parser.add_argument("--metrics-every", type=float, default=10.0,
+                        help="seconds between JSON metrics lines (0 disables them)")
+    parser.add_argument("--metrics-log", help="file for the JSON metrics lines (default: stderr)")
+    parser.add_argument("--profile", nargs="?", const="", metavar="FILE",
+                        help="run under cProfile, print the top functions and optionally save the stats to FILE")
+    args = parser.parse_args()
+
+    # MongoDB setup
+    client = MongoClient(args.mongo_uri)
+    db = client["assignment"]
+    pages_collection = db["pages"]
+
+    metrics_log = open(args.metrics_log, "a") if args.metrics_log else None
+    metrics = CrawlMetrics(args.metrics_every, metrics_log)
+    run = lambda: asyncio.run(crawl(pages_collection, args.start_url, args.prefix, args.heading,
+                                    args.in_flight, args.per_host, args.delay, args.window, args.state, args.parser,
+                                    args.batch_size, not args.no_compress, args.cache, args.max_age, metrics))
+    try:
+        if args.profile is None:
+            run()
+        else:
+            with profiled(args.profile):
+                run()
+    finally:
+        if metrics_log is not None:
+            metrics_log.close()
+
+if __name__ == "__main__":
+    main()
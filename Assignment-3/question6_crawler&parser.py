@@ -1,157 +1,164 @@
-import urllib.parse
+import time
+import argparse
+import urllib.error
 import urllib.request
-from bs4 import BeautifulSoup
 from pymongo import MongoClient
-
-# MongoDB setup
-client = MongoClient("mongodb://localhost:27017/")
-db = client["assignment"]
-pages_collection = db["pages"]
-professors_collection = db["professors"]
+from crawl_frontier import Frontier, canonicalize_url
+from crawl_parser import parse_page
+from crawl_storage import PageStore
+from crawl_fetcher import Response
+from crawl_cache import FetchCache
+from crawl_professors import extract_professors, store_professors, parse_pages
+from crawl_metrics import CrawlMetrics, error_kind, profiled
 
 # Define URLs
 start_url = "https://www.cpp.edu/sci/computer-science/"
 target_url = "https://www.cpp.edu/sci/computer-science/faculty-and-staff/permanent-faculty.shtml"
+allowed_prefix = "https://www.cpp.edu/sci/computer-science"
 
-# Initialize the frontier and visited set
-frontier = [start_url]
-visited = set()
-
-def retrieve_html(url):
+def retrieve_html(url, cache=None, metrics=None):
     try:
-        response = urllib.request.urlopen(url)
-        if "html" in response.getheader("Content-Type"):
-            return response.read()
+        if cache is None:
+            response = urllib.request.urlopen(url)
+            if "html" in response.getheader("Content-Type"):
+                return response.read()
+            return None
+
+        # Serve fresh pages from the cache, otherwise make a conditional request
+        cached = cache.get(url)
+        if cached is None:
+            request = urllib.request.Request(url, headers=cache.request_headers(url))
+            try:
+                with urllib.request.urlopen(request) as response:
+                    result = Response(url, response.status, {k.lower(): v for k, v in response.getheaders()},
+                                      response.read(), None)
+            except urllib.error.HTTPError as e:
+                if e.code != 304:
+                    raise
+                result = Response(url, 304, {k.lower(): v for k, v in e.headers.items()}, b'', None)
+            cached = cache.update(url, result)
+        if "html" in cached.headers.get("content-type", ""):
+            return cached.body
     except Exception as e:
         print(f"Failed to retrieve {url}: {e}")
+        if metrics is not None:
+            metrics.error(error_kind(e))
     return None
 
-def store_page(url, html):
-    if html and not pages_collection.find_one({"url": url}):
-        pages_collection.insert_one({"url": url, "html": html.decode("utf-8")})
-        print(f"Stored page: {url}")
-
-def parse_professor_data(html):
-    soup = BeautifulSoup(html, 'html.parser')
-    professors = soup.find_all("div", class_="clearfix")
-    
-    for professor_info in professors:
-        # Extract name
-        name = None
-        name_tag = professor_info.find("h2")
-        if name_tag:
-            name = name_tag.get_text(strip=True)
-        
-        # Extract title - multiple approaches
-        title = None
-        # Try first approach - strong tag
-        title_tag = professor_info.find("strong", text=lambda t: t and "Title:" in t)
-        if title_tag and title_tag.next_sibling:
-            title = title_tag.next_sibling.strip()
-        # Try second approach - text after Title:
-        if not title:
-            for p in professor_info.find_all("p"):
-                text = p.get_text()
-                if "Title:" in text:
-                    title = text.split("Title:")[1].strip()
-                    break
-
-        # Extract office - multiple approaches
-        office = None
-        office_tag = professor_info.find("strong", text=lambda t: t and "Office:" in t)
-        if office_tag and office_tag.next_sibling:
-            office = office_tag.next_sibling.strip()
-        if not office:
-            for p in professor_info.find_all("p"):
-                text = p.get_text()
-                if "Office:" in text:
-                    office = text.split("Office:")[1].strip()
-                    break
-
-        # Extract phone - multiple approaches
-        phone = None
-        phone_tag = professor_info.find("strong", text=lambda t: t and "Phone:" in t)
-        if phone_tag and phone_tag.next_sibling:
-            phone = phone_tag.next_sibling.strip()
-        if not phone:
-            for p in professor_info.find_all("p"):
-                text = p.get_text()
-                if "Phone:" in text:
-                    phone = text.split("Phone:")[1].strip()
-                    # Clean up incomplete phone numbers
-                    if phone and phone.strip() == "(909) 869-":
-                        phone = None
-                    break
-
-        # Extract email - multiple approaches
-        email = None
-        # Try first approach - mailto link
-        email_tag = professor_info.find("a", href=lambda h: h and "mailto:" in h)
-        if email_tag:
-            email = email_tag.get_text(strip=True)
-            if not email:  # If text is empty, try getting from href
-                email = email_tag["href"].replace("mailto:", "")
-        # Try second approach - text after Email:
-        if not email:
-            for p in professor_info.find_all("p"):
-                text = p.get_text()
-                if "Email:" in text:
-                    email = text.split("Email:")[1].strip()
-                    break
-
-        # Extract website - multiple approaches
-        website = None
-        # Try first approach - Web: link
-        website_tag = professor_info.find("a", text=lambda t: t and ("Web:" in t or "Website" in t))
-        if website_tag and "mailto:" not in website_tag.get("href", ""):
-            website = website_tag["href"]
-        # Try second approach - any non-mailto link after website text
-        if not website:
-            for p in professor_info.find_all("p"):
-                if "Website:" in p.get_text() or "Web:" in p.get_text():
-                    web_link = p.find("a", href=lambda h: h and "mailto:" not in h)
-                    if web_link:
-                        website = web_link["href"]
-                        break
-
-        # Prepare the professor data dictionary
-        professor_data = {
-            "name": name,
-            "title": title,
-            "office": office,
-            "phone": phone,
-            "email": email,
-            "website": website
-        }
-
-        # Only insert if we have at least name and email
-        if name and email and not professors_collection.find_one({"name": name, "email": email}):
-            professors_collection.insert_one(professor_data)
-            print(f"Stored professor: {name}")
-            print(f"Data: {professor_data}")
-
-# Main crawling loop
-while frontier:
-    url = frontier.pop(0)
-    if url in visited:
-        continue
-    visited.add(url)
-    
-    html = retrieve_html(url)
-    if not html:
-        continue
-
-    store_page(url, html)
-    
-    if url == target_url:
-        print(f"Target page found: {url}")
-        parse_professor_data(html)
-        break
-
-    soup = BeautifulSoup(html, 'html.parser')
-    for link in soup.find_all("a", href=True):
-        link_url = urllib.parse.urljoin(url, link["href"])
-        if link_url.startswith("https://www.cpp.edu/sci/computer-science") and link_url not in visited:
-            frontier.append(link_url)
-
-print("Crawling completed!")
\ No newline at end of file
+def parse_professor_data(professors_collection, html):
+    # Single pass over each profile block, then one bulk upsert on (name, email)
+    for professor_data in store_professors(professors_collection, extract_professors(html)):
+        print(f"Stored professor: {professor_data['name']}")
+        print(f"Data: {professor_data}")
+
+# Main crawling loop. With state_path the frontier is journaled there, and rerunning with the same path resumes the crawl.
+# Pages are written in batches, and only count as finished for the frontier once their batch is stored.
+# Each stage is timed into `metrics` (a CrawlMetrics), whose summary is printed at the end
+def crawl(pages_collection, professors_collection, start_url=start_url, target_url=target_url,
+          allowed_prefix=allowed_prefix, state_path=None, parser='stream', batch_size=100, compress=True,
+          cache_path=None, max_age=3600.0, parse_inline=True, metrics=None):
+    metrics = metrics or CrawlMetrics()
+    frontier = Frontier(state_path)
+    cache = FetchCache(cache_path, max_age) if cache_path else None
+    store = PageStore(pages_collection, batch_size, compress, on_flush=lambda urls: frontier.done(*urls))
+    if not frontier.seen:
+        frontier.push(start_url)
+    target = canonicalize_url(target_url)
+
+    try:
+        while frontier:
+            url = frontier.pop()
+            metrics.frontier(len(frontier))
+            metrics.tick()
+
+            with metrics.stage('fetch'):
+                html = retrieve_html(url, cache, metrics)
+            if not html:
+                frontier.done(url)
+                continue
+            metrics.fetched(len(html))
+
+            with metrics.stage('store'):
+                store.add(url, html)
+            print(f"Stored page: {url}")
+
+            if canonicalize_url(url) == target:
+                print(f"Target page found: {url}")
+                # Otherwise the caller runs the parse stage over the stored page
+                if parse_inline:
+                    with metrics.stage('professors'):
+                        parse_professor_data(professors_collection, html)
+                return url
+
+            # Other pages only need their links, so no tree is built for them by default
+            with metrics.stage('parse'):
+                links = parse_page(html, url, parser=parser).links
+            for link_url in links:
+                if link_url.startswith(allowed_prefix):
+                    frontier.push(link_url)
+        return None
+    finally:
+        with metrics.stage('store'):
+            store.close()
+        frontier.close()
+        if cache is not None:
+            print(cache.report())
+            cache.close()
+        if metrics.log_every:
+            metrics.write_snapshot('end')
+        print(metrics.report())
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl to the faculty page and store the professors listed on it")
+    parser.add_argument("--start-url", default=start_url)
+    parser.add_argument("--target-url", default=target_url)
+    parser.add_argument("--prefix", default=allowed_prefix, help="only follow links starting with this")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/")
+    parser.add_argument("--state", help="frontier journal file; rerun with the same file to resume a crawl")
+    parser.add_argument("--parser", choices=("stream", "bs4"), default="stream",
+                        help="streaming link extractor or a BeautifulSoup parse for non-target pages")
+    parser.add_argument("--batch-size", type=int, default=100, help="pages per bulk write")
+    parser.add_argument("--no-compress", action="store_true", help="store HTML as plain text")
+    parser.add_argument("--cache", help="SQLite fetch cache file; re-crawls only refetch changed pages")
+    parser.add_argument("--max-age", type=float, default=3600.0,
+                        help="seconds a cached page is used without revalidation (unless Cache-Control says otherwise)")
+    parser.add_argument("--parse-workers", type=int, default=0,
+                        help="parse the stored target page in a separate stage with this many processes (0: inline)")
+    parser.add_argument("--metrics-every", type=float, default=10.0,
+                        help="seconds between JSON metrics lines (0 disables them)")
+    parser.add_argument("--metrics-log", help="file for the JSON metrics lines (default: stderr)")
+    parser.add_argument("--profile", nargs="?", const="", metavar="FILE",
+                        help="run under cProfile, print the top functions and optionally save the stats to FILE")
+    args = parser.parse_args()
+
+    # MongoDB setup
+    client = MongoClient(args.mongo_uri)
+    db = client["assignment"]
+    pages_collection = db["pages"]
+    professors_collection = db["professors"]
+
+    metrics_log = open(args.metrics_log, "a") if args.metrics_log else None
+    metrics = CrawlMetrics(args.metrics_every, metrics_log)
+
+    def run():
+        found = crawl(pages_collection, professors_collection, args.start_url, args.target_url, args.prefix,
+                      args.state, args.parser, args.batch_size, not args.no_compress, args.cache, args.max_age,
+                      parse_inline=args.parse_workers == 0, metrics=metrics)
+        if found and args.parse_workers > 0:
+            started = time.perf_counter()
+            parsed, added = parse_pages(pages_collection, professors_collection, {"url": found}, args.parse_workers)
+            print(f"Parsed {parsed} stored pages in {time.perf_counter() - started:.2f}s, stored {added} professors")
+
+    try:
+        if args.profile is None:
+            run()
+        else:
+            with profiled(args.profile):
+                run()
+    finally:
+        if metrics_log is not None:
+            metrics_log.close()
+    print("Crawling completed!")
+
+if __name__ == "__main__":
+    main()
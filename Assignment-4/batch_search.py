@@ -0,0 +1,81 @@
+import numpy as np
+from scipy import sparse
+from typing import List, Iterable, Optional
+
+
+class DocumentMatrix:
+    """Sparse term-document TF-IDF matrix loaded from an index backend
+
+    Rows are terms and columns are documents, so a sparse query-term matrix
+    multiplied by it yields every query's cosine numerators at once.
+    """
+
+    def __init__(self, backend):
+        norms = backend.all_norms()
+        self.doc_ids = np.array(sorted(norms), dtype=np.int64)
+        doc_norms = np.array([norms[doc_id] for doc_id in self.doc_ids.tolist()], dtype=np.float64)
+        # Documents without a norm can never score, as in vector_space_search
+        self.inverse_norms = np.divide(1.0, doc_norms, out=np.zeros_like(doc_norms), where=doc_norms > 0)
+
+        self.columns = {}
+        indptr = [0]
+        indices = []
+        data = []
+        # Keyed by str(term) since segments store integer term ids as text
+        for term, postings in backend.iter_postings():
+            self.columns[str(term)] = len(self.columns)
+            indices.append(np.searchsorted(self.doc_ids, np.asarray(postings.doc_ids, dtype=np.int64)))
+            data.append(np.asarray(postings.weights, dtype=np.float64))
+            indptr.append(indptr[-1] + len(postings.doc_ids))
+
+        self.matrix = sparse.csr_matrix(
+            (
+                np.concatenate(data) if data else np.zeros(0),
+                np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64),
+                np.array(indptr, dtype=np.int64)
+            ),
+            shape=(len(self.columns), len(self.doc_ids))
+        )
+
+    def score(self, query_terms: List[Iterable], top_k: Optional[int] = None) -> List[List[tuple]]:
+        """Rank documents for a batch of queries given as n-gram lists
+
+        Returns one list of (doc_id, score) per query, ordered like
+        vector_space_search: by rounded score, then by ascending doc id.
+        """
+        indptr = [0]
+        indices = []
+        for ngrams in query_terms:
+            columns = {self.columns[key] for key in map(str, ngrams) if key in self.columns}
+            indices.extend(sorted(columns))
+            indptr.append(len(indices))
+        indptr = np.array(indptr, dtype=np.int64)
+        queries = sparse.csr_matrix(
+            (np.ones(len(indices)), np.array(indices, dtype=np.int64), indptr),
+            shape=(len(query_terms), len(self.columns))
+        )
+
+        # One sparse multiply for all numerators, then scale by both norms
+        scores = (queries @ self.matrix).tocsr()
+        scores.sort_indices()
+        query_counts = np.diff(indptr)
+        inverse_query_norms = np.divide(
+            1.0, np.sqrt(query_counts), out=np.zeros(len(query_counts)), where=query_counts > 0
+        )
+        row_of = np.repeat(np.arange(scores.shape[0]), np.diff(scores.indptr))
+        scores.data *= inverse_query_norms[row_of] * self.inverse_norms[scores.indices]
+
+        ranked = []
+        for row in range(scores.shape[0]):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            values = scores.data[start:end]
+            columns = scores.indices[start:end]
+            # Any match with a positive norm is ranked, even if its score rounds to 0.0
+            keep = values > 0
+            values, columns = np.round(values[keep], 2), columns[keep]
+            # Columns are sorted, so a stable sort keeps ties in doc id order
+            order = np.argsort(-values, kind='stable')
+            if top_k is not None:
+                order = order[:top_k]
+            ranked.append(list(zip(self.doc_ids[columns[order]].tolist(), values[order].tolist())))
+        return ranked
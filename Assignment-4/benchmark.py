@@ -0,0 +1,352 @@
+"""Benchmark harness for SearchEngine
+
+Builds an index over a synthetic corpus whose vocabulary follows a Zipf
+distribution, replays a generated query log against it and writes the
+results as JSON: build time and throughput, index size, and query latency
+percentiles and throughput per search mode.
+
+Runs against a local mongod when one answers, and otherwise against
+mongomock, an in-process stand-in for MongoDB:
+
+    python benchmark.py --docs 2000 --queries 500 --output results.json
+    python benchmark.py --backend segment --docs 50000
+
+With ``--index both`` each backend is built twice, as the n-gram index and
+as the positional index, and the report adds their size and latency
+ratios, whether they rank the query log identically, and phrase and
+proximity query latency for the positional index:
+
+    python benchmark.py --backend segment --index both --docs 20000
+
+With ``--explain`` the query log is replayed once more per search mode
+with query tracing on, after the timed runs, and the report adds each
+mode's aggregated explain output: time per stage, backend round trips
+and candidate-set sizes.
+"""
+import sys
+import json
+import time
+import random
+import shutil
+import bisect
+import argparse
+import platform
+import tempfile
+from itertools import accumulate
+from typing import List, Dict, Any, Optional, Tuple
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from main import SearchEngine, describe_build
+from query_trace import TraceSummary, percentile
+
+SYLLABLES = [c + v for c in 'bdfgklmnprstvz' for v in 'aeiou']
+
+
+def make_word(rank: int) -> str:
+    """Spell a distinct pronounceable word for each vocabulary rank"""
+    word = ''
+    rank += 1
+    while rank:
+        rank, digit = divmod(rank - 1, len(SYLLABLES))
+        word = SYLLABLES[digit] + word
+    return word
+
+
+class ZipfSampler:
+    """Draws vocabulary ranks with probability proportional to 1 / rank ** exponent"""
+
+    def __init__(self, size: int, exponent: float, rng: random.Random):
+        self.rng = rng
+        self.cumulative = list(accumulate(1.0 / rank ** exponent for rank in range(1, size + 1)))
+
+    def sample(self, count: int) -> List[int]:
+        total = self.cumulative[-1]
+        return [bisect.bisect_left(self.cumulative, self.rng.random() * total) for _ in range(count)]
+
+
+def generate_corpus(num_docs: int, doc_length: int, vocab_size: int, exponent: float = 1.1,
+                    seed: int = 0) -> List[str]:
+    """Generate documents of roughly doc_length words drawn from a Zipfian vocabulary"""
+    rng = random.Random(seed)
+    vocabulary = [make_word(rank) for rank in range(vocab_size)]
+    sampler = ZipfSampler(vocab_size, exponent, rng)
+    documents = []
+    for _ in range(num_docs):
+        length = rng.randint(max(1, doc_length // 2), max(1, doc_length * 3 // 2))
+        words = [vocabulary[rank] for rank in sampler.sample(length)]
+        documents.append(' '.join(words).capitalize() + '.')
+    return documents
+
+
+def generate_queries(num_queries: int, documents: List[str], vocab_size: int, exponent: float = 1.1,
+                     distinct: int = 1000, max_words: int = 3, seed: int = 0) -> List[str]:
+    """Generate a query log with repeats, as real query traffic has
+
+    A pool of distinct queries is drawn first: half are word spans copied
+    from documents (so bigrams and trigrams match), half are independent
+    vocabulary words. The log then samples that pool with Zipfian
+    popularity, so a few queries are very frequent.
+    """
+    rng = random.Random(seed + 1)
+    sampler = ZipfSampler(vocab_size, exponent, rng)
+    pool = []
+    for i in range(distinct):
+        length = rng.randint(1, max_words)
+        if i % 2 == 0:
+            words = rng.choice(documents).rstrip('.').lower().split()
+            start = rng.randrange(max(1, len(words) - length + 1))
+            pool.append(' '.join(words[start:start + length]))
+        else:
+            pool.append(' '.join(make_word(rank) for rank in sampler.sample(length)))
+    popularity = ZipfSampler(len(pool), 1.0, rng)
+    return [pool[i] for i in popularity.sample(num_queries)]
+
+
+def generate_phrases(num_phrases: int, documents: List[str], min_words: int = 2, max_words: int = 6,
+                     seed: int = 0) -> List[str]:
+    """Generate phrase queries: word spans of min_words to max_words copied from documents"""
+    rng = random.Random(seed + 2)
+    phrases = []
+    for _ in range(num_phrases):
+        words = rng.choice(documents).rstrip('.').lower().split()
+        length = rng.randint(min_words, max_words)
+        start = rng.randrange(max(1, len(words) - length + 1))
+        phrases.append(' '.join(words[start:start + length]))
+    return phrases
+
+
+def latency_summary(latencies: List[float], elapsed: float) -> Dict[str, float]:
+    """Summarize per-query latencies (seconds) as milliseconds plus throughput"""
+    ordered = sorted(latencies)
+    return {
+        'queries': len(ordered),
+        'mean_ms': round(1000 * sum(ordered) / len(ordered), 4) if ordered else 0.0,
+        'p50_ms': round(1000 * percentile(ordered, 50), 4),
+        'p95_ms': round(1000 * percentile(ordered, 95), 4),
+        'p99_ms': round(1000 * percentile(ordered, 99), 4),
+        'max_ms': round(1000 * ordered[-1], 4) if ordered else 0.0,
+        'queries_per_sec': round(len(ordered) / elapsed, 2) if elapsed > 0 else 0.0
+    }
+
+
+def connect_mongo(mode: str, uri: str) -> Tuple[Any, str]:
+    """Return a MongoDB client and its kind: a local mongod if reachable, else mongomock"""
+    if mode in ('auto', 'local'):
+        client = MongoClient(uri, serverSelectionTimeoutMS=500)
+        try:
+            client.admin.command('ping')
+            return client, 'mongod'
+        except PyMongoError:
+            client.close()
+            if mode == 'local':
+                raise
+    import mongomock
+    return mongomock.MongoClient(), 'mongomock'
+
+
+def time_queries(search_engine: SearchEngine, queries: List[str], search: Any = None,
+                 **options) -> Dict[str, float]:
+    search = search or search_engine.vector_space_search
+    latencies = []
+    started = time.perf_counter()
+    for query in queries:
+        query_started = time.perf_counter()
+        search(query, **options)
+        latencies.append(time.perf_counter() - query_started)
+    return latency_summary(latencies, time.perf_counter() - started)
+
+
+def explain_queries(search_engine: SearchEngine, queries: List[str], **options) -> Dict[str, Any]:
+    """Trace every query and aggregate the explains"""
+    summary = TraceSummary()
+    for query in queries:
+        _, explain = search_engine.vector_space_search(query, explain=True, **options)
+        summary.add(explain)
+    return summary.summary()
+
+
+def run_backend(backend: str, documents: List[str], queries: List[str], args,
+                mongo_client: Any = None, index: str = 'ngram', phrases: Optional[List[str]] = None,
+                rankings: Optional[List] = None) -> Dict[str, Any]:
+    """Build an index on one backend and time every search mode against it
+
+    The top-k results of every query are appended to ``rankings`` if given.
+    """
+    index_dir = None
+    if backend == 'segment':
+        index_dir = args.index_dir or tempfile.mkdtemp(prefix='benchmark-')
+    try:
+        search_engine = SearchEngine(backend=backend, index_dir=index_dir, mongo_client=mongo_client,
+                                     cache_results=args.cache_results, cache_postings=args.cache_postings,
+                                     tokenizer=args.tokenizer, index=index)
+        build = search_engine.bulk_index_documents(documents, batch_size=args.batch_size,
+                                                   workers=args.workers)
+        # Progress goes to stderr so that stdout stays parseable JSON
+        print(f"{backend}/{index}: {describe_build(build)}", file=sys.stderr)
+
+        # Warm up connections, page cache and lazily loaded state before timing
+        for query in queries[:args.warmup]:
+            search_engine.vector_space_search(query, top_k=args.top_k)
+        if search_engine.cache is not None:
+            search_engine.cache.invalidate()
+
+        results = {
+            'build': build,
+            'index_size': search_engine.index_size(),
+            'search': {
+                'exhaustive': time_queries(search_engine, queries),
+                f'top_{args.top_k}': time_queries(search_engine, queries, top_k=args.top_k)
+            }
+        }
+
+        if index == 'positional':
+            results['search']['batch'] = {'skipped': "search_batch requires the n-gram index"}
+            if phrases:
+                results['search']['phrase'] = time_queries(search_engine, phrases, search_engine.phrase_search,
+                                                           top_k=args.top_k)
+                results['search']['proximity'] = time_queries(search_engine, phrases,
+                                                              search_engine.proximity_search,
+                                                              window=args.proximity_window, top_k=args.top_k)
+        else:
+            try:
+                started = time.perf_counter()
+                search_engine.search_batch(queries, top_k=args.top_k)
+                elapsed = time.perf_counter() - started
+                results['search']['batch'] = {
+                    'queries': len(queries),
+                    'seconds': round(elapsed, 4),
+                    'queries_per_sec': round(len(queries) / elapsed, 2) if elapsed > 0 else 0.0
+                }
+            except ImportError as e:
+                # numpy/scipy are optional
+                results['search']['batch'] = {'skipped': str(e)}
+
+        if args.explain:
+            # Traced separately so that tracing overhead stays out of the timings
+            results['explain'] = {
+                'exhaustive': explain_queries(search_engine, queries),
+                f'top_{args.top_k}': explain_queries(search_engine, queries, top_k=args.top_k)
+            }
+
+        if rankings is not None:
+            rankings.extend(search_engine.vector_space_search(query, top_k=args.top_k) for query in queries)
+
+        results['cache'] = search_engine.cache_stats()
+        results['memory'] = search_engine.memory_usage()
+        return results
+    finally:
+        # Only remove segment directories this run created
+        if index_dir is not None and args.index_dir is None:
+            shutil.rmtree(index_dir, ignore_errors=True)
+
+
+def compare_indexes(ngram: Dict[str, Any], positional: Dict[str, Any],
+                    ngram_rankings: List, positional_rankings: List) -> Dict[str, Any]:
+    """Size and latency of the positional index relative to the n-gram index (ratios below 1 favour positional)"""
+    def ratio(a, b):
+        return round(a / b, 4) if b else None
+
+    ngram_bytes = sum(ngram['index_size'].values())
+    positional_bytes = sum(positional['index_size'].values())
+    comparison = {
+        'ngram_bytes': ngram_bytes,
+        'positional_bytes': positional_bytes,
+        'size_ratio': ratio(positional_bytes, ngram_bytes),
+        'build_seconds_ratio': ratio(positional['build']['seconds'], ngram['build']['seconds']),
+        'same_top_k_rankings': round(sum(a == b for a, b in zip(ngram_rankings, positional_rankings))
+                                     / len(ngram_rankings), 4) if ngram_rankings else None
+    }
+    for mode, latencies in ngram['search'].items():
+        if 'p50_ms' in latencies and mode in positional['search']:
+            comparison[f'{mode}_p50_ratio'] = ratio(positional['search'][mode]['p50_ms'], latencies['p50_ms'])
+            comparison[f'{mode}_p95_ratio'] = ratio(positional['search'][mode]['p95_ms'], latencies['p95_ms'])
+    return comparison
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark SearchEngine on a synthetic Zipfian corpus")
+    parser.add_argument('--docs', type=int, default=2000, help="number of documents")
+    parser.add_argument('--doc-length', type=int, default=50, help="mean words per document")
+    parser.add_argument('--vocab', type=int, default=5000, help="vocabulary size")
+    parser.add_argument('--zipf', type=float, default=1.1, help="Zipf exponent of word frequencies")
+    parser.add_argument('--queries', type=int, default=500, help="number of queries in the log")
+    parser.add_argument('--distinct-queries', type=int, default=200, help="distinct queries in the log")
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=20, help="untimed queries run first")
+    parser.add_argument('--backend', choices=('mongo', 'segment', 'both'), default='both')
+    parser.add_argument('--index', choices=('ngram', 'positional', 'both'), default='ngram',
+                        help="n-gram terms, unigram positions, or both to compare them")
+    parser.add_argument('--phrases', type=int, default=200, help="phrase queries run on the positional index")
+    parser.add_argument('--phrase-words', type=int, default=6, help="longest phrase query, in words")
+    parser.add_argument('--proximity-window', type=int, default=8,
+                        help="window of the proximity queries (the phrase queries' words, in any order)")
+    parser.add_argument('--mongo', choices=('auto', 'local', 'mongomock'), default='auto',
+                        help="use a local mongod, mongomock, or mongod when reachable")
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017/')
+    parser.add_argument('--index-dir', help="segment directory (default: a temporary one)")
+    parser.add_argument('--tokenizer', choices=('string', 'intern', 'hash'), default='string')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--cache-results', type=int, default=0)
+    parser.add_argument('--cache-postings', type=int, default=0)
+    parser.add_argument('--explain', action='store_true',
+                        help="also report per-stage time, round trips and candidate sizes of traced queries")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write JSON results here instead of stdout")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+
+    started = time.perf_counter()
+    documents = generate_corpus(args.docs, args.doc_length, args.vocab, args.zipf, args.seed)
+    queries = generate_queries(args.queries, documents, args.vocab, args.zipf,
+                               distinct=args.distinct_queries, seed=args.seed)
+    phrases = generate_phrases(args.phrases, documents, max_words=args.phrase_words, seed=args.seed)
+    generation_seconds = time.perf_counter() - started
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'parameters': vars(args),
+        'corpus': {
+            'documents': len(documents),
+            'words': sum(len(doc.split()) for doc in documents),
+            'queries': len(queries),
+            'distinct_queries': len(set(queries)),
+            'generation_seconds': round(generation_seconds, 4)
+        },
+        'backends': {}
+    }
+
+    backends = ('mongo', 'segment') if args.backend == 'both' else (args.backend,)
+    indexes = ('ngram', 'positional') if args.index == 'both' else (args.index,)
+    for backend in backends:
+        mongo_client = None
+        if backend == 'mongo':
+            mongo_client, kind = connect_mongo(args.mongo, args.mongo_uri)
+            report['mongo'] = kind
+        rankings = {}
+        for index in indexes:
+            # The n-gram results keep their original keys
+            name = backend if index == 'ngram' else f'{backend}-positional'
+            rankings[index] = [] if len(indexes) > 1 else None
+            report['backends'][name] = run_backend(backend, documents, queries, args, mongo_client,
+                                                   index, phrases, rankings[index])
+        if len(indexes) > 1:
+            report.setdefault('comparison', {})[backend] = compare_indexes(
+                report['backends'][backend], report['backends'][f'{backend}-positional'],
+                rankings['ngram'], rankings['positional'])
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,744 @@
+import os
+import sys
+import mmap
+import math
+import shutil
+import struct
+import tempfile
+from array import array
+from itertools import accumulate
+from collections import namedtuple
+import bson
+from bson.binary import Binary
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import OperationFailure
+from typing import List, Dict, Any, Iterable, Optional
+
+# Postings of one term as parallel arrays sorted by doc id, plus the term's
+# upper-bound contribution to any document's cosine numerator (tf_idf / norm)
+PostingsList = namedtuple('PostingsList', ['doc_ids', 'weights', 'max_score'])
+
+# Postings of one unigram in the positional index: doc ids in ascending order
+# and, for each document, the ascending token positions of the term
+PositionalPostings = namedtuple('PositionalPostings', ['doc_ids', 'positions'])
+
+
+class MongoBackend:
+    """Index stored in MongoDB: one `terms` record per term, one `documents` record per document
+
+    Postings keep the raw term frequency (`tf`) next to `tf_idf` and terms
+    keep their document frequency (`df`), so documents can be added, updated
+    and deleted in place. Such changes shift every IDF, so they mark the
+    weights stale until `refresh_weights` recomputes them.
+
+    A positional index instead keeps one `positions` record per unigram,
+    holding its `df` and its postings encoded by `encode_positional`.
+    Interned token ids are kept as one `tokens` record per token.
+    """
+
+    def __init__(self, uri: str = 'mongodb://localhost:27017/', db_name: str = 'search_engine_db',
+                 reset: bool = True, client: Optional[MongoClient] = None):
+        # MongoDB connection, or an existing client (e.g. mongomock) if one is given
+        self.client = client if client is not None else MongoClient(uri)
+        self.db = self.client[db_name]
+
+        # Clear existing collections
+        if reset:
+            self.clear()
+
+        # Initialize collections
+        self.terms_collection = self.db['terms']
+        self.documents_collection = self.db['documents']
+        self.meta_collection = self.db['meta']
+        self.positions_collection = self.db['positions']
+        self.tokens_collection = self.db['tokens']
+
+        self._create_indexes()
+
+        state = self.meta_collection.find_one({'_id': 'weights'}) or {}
+        self.stale = state.get('stale', False)
+
+    def clear(self):
+        """Drop the terms, positions, tokens and documents collections"""
+        self.db['terms'].drop()
+        self.db['documents'].drop()
+        self.db['meta'].drop()
+        self.db['positions'].drop()
+        self.db['tokens'].drop()
+        self.stale = False
+
+    def _create_indexes(self):
+        # Lets deletes and updates find a document's postings without a scan
+        self.terms_collection.create_index('docs.doc_id')
+
+    def writer(self, batch_size: int = 1000) -> 'MongoIndexWriter':
+        """Clear the index and return a writer that loads a new one with batched writes"""
+        self.clear()
+        self._create_indexes()
+        return MongoIndexWriter(self, batch_size)
+
+    def fetch_postings(self, term: str) -> Optional[PostingsList]:
+        """Return the postings of a term in one round trip"""
+        term_record = self.terms_collection.find_one(
+            {'_id': term}, {'docs.doc_id': 1, 'docs.tf_idf': 1, 'max_score': 1}
+        )
+        if not term_record or not term_record.get('docs'):
+            return None
+        docs = sorted((doc['doc_id'], doc['tf_idf']) for doc in term_record['docs'])
+        # tf_idf never exceeds the document norm, so 1.0 bounds indexes without max_score
+        return PostingsList(
+            doc_ids=[doc_id for doc_id, _ in docs],
+            weights=[tf_idf for _, tf_idf in docs],
+            max_score=term_record.get('max_score', 1.0)
+        )
+
+    def fetch_positions(self, term) -> Optional[PositionalPostings]:
+        """Return the positional postings of a unigram in one round trip"""
+        record = self.positions_collection.find_one({'_id': term})
+        if not record:
+            return None
+        return decode_positional(record['postings'], record['df'])
+
+    def document_count(self) -> int:
+        return self.documents_collection.count_documents({})
+
+    def fetch_norms(self, doc_ids: Iterable[int]) -> Dict[int, float]:
+        """Return the stored vector norms of a set of documents in one round trip"""
+        cursor = self.documents_collection.find({'_id': {'$in': list(doc_ids)}}, {'norm': 1})
+        return {doc['_id']: doc.get('norm', 0.0) for doc in cursor}
+
+    def fetch_documents(self, doc_ids: Iterable[int]) -> Dict[int, str]:
+        """Return the content of a set of documents in one round trip"""
+        cursor = self.documents_collection.find({'_id': {'$in': list(doc_ids)}}, {'content': 1})
+        return {doc['_id']: doc['content'] for doc in cursor}
+
+    def iter_postings(self) -> Iterable[tuple]:
+        """Yield (term, PostingsList) for every term in the index"""
+        for record in self.terms_collection.find({}, {'docs.doc_id': 1, 'docs.tf_idf': 1, 'max_score': 1}):
+            if record.get('docs'):
+                docs = sorted((doc['doc_id'], doc['tf_idf']) for doc in record['docs'])
+                yield record['_id'], PostingsList(
+                    doc_ids=[doc_id for doc_id, _ in docs],
+                    weights=[tf_idf for _, tf_idf in docs],
+                    max_score=record.get('max_score', 1.0)
+                )
+
+    def all_norms(self) -> Dict[int, float]:
+        """Return the stored vector norm of every document"""
+        return {doc['_id']: doc.get('norm', 0.0) for doc in self.documents_collection.find({}, {'norm': 1})}
+
+    def load_vocabulary(self) -> Dict[str, int]:
+        """Return the vocabulary positions recorded in an existing index"""
+        cursor = self.terms_collection.find({}, {'docs': {'$slice': 1}})
+        return {record['_id']: record['docs'][0]['pos'] for record in cursor if record.get('docs')}
+
+    def index_size(self) -> Dict[str, int]:
+        """Return the bytes taken by the index's documents and MongoDB indexes"""
+        try:
+            stats = self.db.command('dbstats')
+            return {'data_bytes': int(stats['dataSize']), 'index_bytes': int(stats['indexSize'])}
+        except (OperationFailure, NotImplementedError):
+            # In-process stand-ins such as mongomock have no dbstats; measure the BSON instead
+            data_bytes = sum(len(bson.encode(record))
+                             for name in ('terms', 'positions', 'tokens', 'documents', 'meta')
+                             for record in self.db[name].find())
+            return {'data_bytes': data_bytes, 'index_bytes': 0}
+
+    def load_tokens(self) -> List[str]:
+        """Return the interned tokens saved with the index, in id order"""
+        return [record['token'] for record in self.tokens_collection.find().sort('_id', 1)]
+
+    def add_tokens(self, first_id: int, tokens: List[str]):
+        """Save newly interned tokens, the first of which has id `first_id`"""
+        if tokens:
+            self.tokens_collection.insert_many(
+                [{'_id': token_id, 'token': token} for token_id, token in enumerate(tokens, first_id)],
+                ordered=False)
+
+    def next_doc_id(self) -> int:
+        last = list(self.documents_collection.find({}, {'_id': 1}).sort('_id', -1).limit(1))
+        return last[0]['_id'] + 1 if last else 1
+
+    def mark_stale(self, stale: bool = True):
+        self.stale = stale
+        self.meta_collection.update_one({'_id': 'weights'}, {'$set': {'stale': stale}}, upsert=True)
+
+    def _write_terms(self, ops: List[UpdateOne], batch_size: int = 1000):
+        for i in range(0, len(ops), batch_size):
+            self.terms_collection.bulk_write(ops[i:i + batch_size], ordered=False)
+
+    def _add_posting(self, term: str, doc_id: int, freq: int, pos: int) -> UpdateOne:
+        # tf_idf is filled in by the next refresh_weights
+        return UpdateOne(
+            {'_id': term},
+            {'$push': {'docs': {'doc_id': doc_id, 'tf': freq, 'tf_idf': 0.0, 'pos': pos}},
+             '$inc': {'df': 1}},
+            upsert=True
+        )
+
+    def _remove_posting(self, term: str, doc_id: int) -> UpdateOne:
+        return UpdateOne({'_id': term}, {'$pull': {'docs': {'doc_id': doc_id}}, '$inc': {'df': -1}})
+
+    def add_document(self, doc_id: int, content: str, length: int,
+                     term_freq: Dict[str, int], positions: Dict[str, int]):
+        """Insert one document and push its postings"""
+        self.documents_collection.insert_one({'_id': doc_id, 'content': content, 'length': length})
+        self._write_terms([
+            self._add_posting(term, doc_id, freq, positions[term]) for term, freq in term_freq.items()
+        ])
+        self.mark_stale()
+
+    def update_document(self, doc_id: int, content: str, length: int, old_term_freq: Dict[str, int],
+                        term_freq: Dict[str, int], positions: Dict[str, int]):
+        """Replace a document, touching only the postings whose frequency changed"""
+        ops = []
+        for term, freq in term_freq.items():
+            if term not in old_term_freq:
+                ops.append(self._add_posting(term, doc_id, freq, positions[term]))
+            elif old_term_freq[term] != freq:
+                ops.append(UpdateOne({'_id': term, 'docs.doc_id': doc_id}, {'$set': {'docs.$.tf': freq}}))
+        ops.extend(self._remove_posting(term, doc_id) for term in old_term_freq if term not in term_freq)
+        self._write_terms(ops)
+        self.terms_collection.delete_many({'df': {'$lte': 0}})
+        self.documents_collection.update_one(
+            {'_id': doc_id}, {'$set': {'content': content, 'length': length}, '$unset': {'norm': ''}}
+        )
+        self.mark_stale()
+
+    def delete_document(self, doc_id: int) -> bool:
+        """Remove a document and all of its postings"""
+        if self.documents_collection.delete_one({'_id': doc_id}).deleted_count == 0:
+            return False
+        self.terms_collection.update_many(
+            {'docs.doc_id': doc_id}, {'$pull': {'docs': {'doc_id': doc_id}}, '$inc': {'df': -1}}
+        )
+        self.terms_collection.delete_many({'df': {'$lte': 0}})
+        self.mark_stale()
+        return True
+
+    def refresh_weights(self, batch_size: int = 1000):
+        """Recompute tf_idf, document norms and term upper bounds from tf, df and N"""
+        num_docs = self.documents_collection.count_documents({})
+
+        def weighted(record):
+            idf = math.log(num_docs / (len(record['docs']) + 1)) + 1
+            return [(doc, (1 + math.log(doc['tf'])) * idf) for doc in record['docs']]
+
+        # First pass: document norms
+        norms = {}
+        for record in self.terms_collection.find({}, {'docs.doc_id': 1, 'docs.tf': 1}):
+            for doc, tfidf in weighted(record):
+                norms[doc['doc_id']] = norms.get(doc['doc_id'], 0.0) + tfidf**2
+        norms = {doc_id: math.sqrt(norm_sq) for doc_id, norm_sq in norms.items()}
+        ops = [UpdateOne({'_id': doc_id}, {'$set': {'norm': norm}}) for doc_id, norm in norms.items()]
+        for i in range(0, len(ops), batch_size):
+            self.documents_collection.bulk_write(ops[i:i + batch_size], ordered=False)
+
+        # Second pass: rewrite each term's postings in doc id order with fresh weights
+        ops = []
+        for record in self.terms_collection.find({}):
+            docs = []
+            max_score = 0.0
+            for doc, tfidf in sorted(weighted(record), key=lambda entry: entry[0]['doc_id']):
+                docs.append(dict(doc, tf_idf=tfidf))
+                max_score = max(max_score, tfidf / norms[doc['doc_id']])
+            ops.append(UpdateOne(
+                {'_id': record['_id']},
+                {'$set': {'docs': docs, 'df': len(docs), 'max_score': max_score}}
+            ))
+        self._write_terms(ops, batch_size)
+        self.mark_stale(False)
+
+
+class MongoIndexWriter:
+    """Writes documents, norms and term postings with insert_many/bulk_write batches
+
+    Each term is written once, as a complete record, into collections that
+    `MongoBackend.writer` has just cleared, so terms are inserted rather
+    than upserted.
+    """
+
+    def __init__(self, backend: MongoBackend, batch_size: int):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.norms = {}
+        self._terms = []
+        self._positions = []
+
+    def add_documents(self, docs: List[Dict[str, Any]]):
+        self.backend.documents_collection.insert_many(docs, ordered=False)
+
+    def set_norms(self, norms: Dict[int, float]):
+        self.norms = norms
+        ops = [UpdateOne({'_id': doc_id}, {'$set': {'norm': norm}}) for doc_id, norm in norms.items()]
+        for i in range(0, len(ops), self.batch_size):
+            self.backend.documents_collection.bulk_write(ops[i:i + self.batch_size], ordered=False)
+
+    def add_term(self, term: str, pos: int, postings: List[tuple]):
+        """Queue a term's (doc_id, tf, tf_idf) postings; norms must already be set"""
+        self._terms.append({
+            '_id': term,
+            'docs': [{'doc_id': doc_id, 'tf': freq, 'tf_idf': tfidf, 'pos': pos}
+                     for doc_id, freq, tfidf in postings],
+            'max_score': max(tfidf / self.norms[doc_id] for doc_id, _, tfidf in postings),
+            'df': len(postings)
+        })
+        if len(self._terms) >= self.batch_size:
+            self._flush()
+
+    def set_tokens(self, tokens: List[str]):
+        """Save the interned token dictionary, replacing any saved before"""
+        self.backend.tokens_collection.drop()
+        for i in range(0, len(tokens), self.batch_size):
+            self.backend.add_tokens(i + 1, tokens[i:i + self.batch_size])
+
+    def add_positions(self, term, postings: List[tuple]):
+        """Queue a unigram's (doc_id, positions) postings for the positional index"""
+        self._positions.append({'_id': term, 'df': len(postings),
+                                'postings': Binary(encode_positional(postings))})
+        if len(self._positions) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if self._terms:
+            self.backend.terms_collection.insert_many(self._terms, ordered=False)
+            self._terms = []
+        if self._positions:
+            self.backend.positions_collection.insert_many(self._positions, ordered=False)
+            self._positions = []
+
+    def close(self):
+        self._flush()
+
+
+# Segment file layout (all integers little-endian):
+#   terms.dat     header, then one fixed-width entry per term sorted by key bytes,
+#                 then the concatenated UTF-8 term keys
+#   postings.dat  per term: varint doc-id gaps, padding to an even offset, then
+#                 one uint16 quantized weight per posting (weight = q * scale);
+#                 in a positional segment, the term's encode_positional bytes
+#   docs.dat      header, then one fixed-width entry per document sorted by doc id
+#   contents.dat  concatenated UTF-8 document contents
+#   tokens.dat    interned tokens in id order, one per line (only written in 'intern' mode)
+TERMS_MAGIC = b'IRTERMS1'
+POSITIONAL_TERMS_MAGIC = b'IRTERMP1'
+DOCS_MAGIC = b'IRDOCS01'
+HEADER = struct.Struct('<8sQ')
+# key offset, key length, df, postings offset, doc-id bytes, max_score, scale
+TERM_ENTRY = struct.Struct('<QIIQIdd')
+# doc id, content offset, content length, token length, norm
+DOC_ENTRY = struct.Struct('<QQIId')
+WEIGHT_LEVELS = 65535
+
+
+def encode_varint(value: int, out: bytearray):
+    """Append an unsigned LEB128 varint"""
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_gaps(buf, count: int) -> List[int]:
+    """Decode `count` varint gaps from a buffer back into absolute doc ids"""
+    doc_ids = []
+    doc_id = 0
+    pos = 0
+    for _ in range(count):
+        value = 0
+        shift = 0
+        while True:
+            byte = buf[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        doc_id += value
+        doc_ids.append(doc_id)
+    return doc_ids
+
+
+def decode_varints(buf) -> List[int]:
+    """Decode every unsigned LEB128 varint of a buffer"""
+    values = []
+    value = 0
+    shift = 0
+    for byte in buf:
+        if byte < 0x80:
+            values.append(value | byte << shift)
+            value = 0
+            shift = 0
+        else:
+            value |= (byte & 0x7F) << shift
+            shift += 7
+    return values
+
+
+def encode_positional(postings: List[tuple]) -> bytes:
+    """Encode (doc_id, positions) postings, sorted by doc id, as varints
+
+    Each document is written as its doc-id gap, its number of positions
+    and then the gaps between its ascending positions.
+    """
+    out = bytearray()
+    previous = 0
+    for doc_id, positions in postings:
+        encode_varint(doc_id - previous, out)
+        encode_varint(len(positions), out)
+        previous = doc_id
+        last = 0
+        for position in positions:
+            encode_varint(position - last, out)
+            last = position
+    return bytes(out)
+
+
+def decode_positional(buf, count: int) -> PositionalPostings:
+    """Decode `count` documents written by encode_positional"""
+    values = decode_varints(buf)
+    doc_ids = []
+    positions = []
+    doc_id = 0
+    i = 0
+    for _ in range(count):
+        doc_id += values[i]
+        tf = values[i + 1]
+        doc_ids.append(doc_id)
+        positions.append(list(accumulate(values[i + 2:i + 2 + tf])))
+        i += 2 + tf
+    return PositionalPostings(doc_ids=doc_ids, positions=positions)
+
+
+def term_key(term) -> bytes:
+    return str(term).encode('utf-8')
+
+
+class SegmentWriter:
+    """Builds one immutable segment in a scratch directory and publishes it on close"""
+
+    def __init__(self, backend: 'SegmentBackend'):
+        self.backend = backend
+        self.path = tempfile.mkdtemp(prefix='.building-', dir=backend.index_dir)
+        self.norms = {}
+        self.positional = False
+        self._docs = []
+        self._terms = []
+        self._contents = open(os.path.join(self.path, 'contents.dat'), 'wb')
+        self._postings = open(os.path.join(self.path, 'postings.dat'), 'wb')
+
+    def add_documents(self, docs: List[Dict[str, Any]]):
+        for doc in docs:
+            data = doc['content'].encode('utf-8')
+            self._docs.append((doc['_id'], self._contents.tell(), len(data), doc.get('length', 0)))
+            self._contents.write(data)
+
+    def set_norms(self, norms: Dict[int, float]):
+        self.norms = norms
+
+    def add_term(self, term, pos: int, postings: List[tuple]):
+        """Append a term's (doc_id, tf, tf_idf) postings, sorted by doc id; norms must already be set"""
+        max_weight = max(tfidf for _, _, tfidf in postings)
+        scale = max_weight / WEIGHT_LEVELS if max_weight > 0 else 1.0
+
+        gaps = bytearray()
+        previous = 0
+        for doc_id, _, _ in postings:
+            encode_varint(doc_id - previous, gaps)
+            previous = doc_id
+        offset = self._postings.tell()
+        if (offset + len(gaps)) % 2:
+            gaps.append(0)
+
+        weights = array('H', (min(WEIGHT_LEVELS, round(tfidf / scale)) for _, _, tfidf in postings))
+        # Bound the score with the dequantized weights that queries will actually see
+        max_score = max(q * scale / self.norms[doc_id] for q, (doc_id, _, _) in zip(weights, postings))
+        if sys.byteorder != 'little':
+            weights.byteswap()
+
+        self._postings.write(gaps)
+        self._postings.write(weights.tobytes())
+        self._terms.append((term_key(term), len(postings), offset, len(gaps), max_score, scale))
+
+    def set_tokens(self, tokens: List[str]):
+        """Save the interned token dictionary with the segment"""
+        with open(os.path.join(self.path, 'tokens.dat'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(tokens))
+
+    def add_positions(self, term, postings: List[tuple]):
+        """Append a unigram's (doc_id, positions) postings; makes this a positional segment"""
+        data = encode_positional(postings)
+        offset = self._postings.tell()
+        self._postings.write(data)
+        self.positional = True
+        self._terms.append((term_key(term), len(postings), offset, len(data), 0.0, 0.0))
+
+    def close(self):
+        self._contents.close()
+        self._postings.close()
+
+        self._terms.sort(key=lambda entry: entry[0])
+        with open(os.path.join(self.path, 'terms.dat'), 'wb') as f:
+            magic = POSITIONAL_TERMS_MAGIC if self.positional else TERMS_MAGIC
+            f.write(HEADER.pack(magic, len(self._terms)))
+            key_offset = 0
+            for key, df, offset, gap_bytes, max_score, scale in self._terms:
+                f.write(TERM_ENTRY.pack(key_offset, len(key), df, offset, gap_bytes, max_score, scale))
+                key_offset += len(key)
+            for key, *_ in self._terms:
+                f.write(key)
+
+        self._docs.sort()
+        with open(os.path.join(self.path, 'docs.dat'), 'wb') as f:
+            f.write(HEADER.pack(DOCS_MAGIC, len(self._docs)))
+            for doc_id, offset, size, length in self._docs:
+                f.write(DOC_ENTRY.pack(doc_id, offset, size, length, self.norms.get(doc_id, 0.0)))
+
+        self.backend.publish(self.path)
+
+
+class SegmentReader:
+    """Read-only view of a segment; files are memory-mapped and decoded in place"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._files = []
+        self._maps = []
+        self._terms = self._map('terms.dat')
+        self._postings = self._map('postings.dat')
+        self._docs = self._map('docs.dat')
+        self._contents = self._map('contents.dat')
+
+        magic, self.num_terms = HEADER.unpack_from(self._terms, 0)
+        if magic not in (TERMS_MAGIC, POSITIONAL_TERMS_MAGIC):
+            raise ValueError(f"Not a terms file: {path}")
+        self.positional = magic == POSITIONAL_TERMS_MAGIC
+        self._keys_start = HEADER.size + self.num_terms * TERM_ENTRY.size
+
+        magic, self.num_docs = HEADER.unpack_from(self._docs, 0)
+        if magic != DOCS_MAGIC:
+            raise ValueError(f"Not a documents file: {path}")
+
+    def tokens(self) -> List[str]:
+        """Interned tokens saved with the segment, in id order"""
+        try:
+            with open(os.path.join(self.path, 'tokens.dat'), encoding='utf-8') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        return data.split('\n') if data else []
+
+    def _map(self, name: str) -> memoryview:
+        f = open(os.path.join(self.path, name), 'rb')
+        self._files.append(f)
+        if os.fstat(f.fileno()).st_size == 0:
+            return memoryview(b'')
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return memoryview(mapped)
+
+    def _term_entry(self, index: int) -> tuple:
+        return TERM_ENTRY.unpack_from(self._terms, HEADER.size + index * TERM_ENTRY.size)
+
+    def _find_term(self, key: bytes) -> Optional[tuple]:
+        lo, hi = 0, self.num_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._term_entry(mid)
+            start = self._keys_start + entry[0]
+            candidate = self._terms[start:start + entry[1]].tobytes()
+            if candidate < key:
+                lo = mid + 1
+            elif candidate > key:
+                hi = mid
+            else:
+                return entry
+        return None
+
+    def postings(self, term) -> Optional[PostingsList]:
+        if self.positional:
+            raise ValueError(f"{self.path} is a positional segment")
+        entry = self._find_term(term_key(term))
+        if entry is None:
+            return None
+        return self._decode(entry)
+
+    def positions(self, term) -> Optional[PositionalPostings]:
+        if not self.positional:
+            raise ValueError(f"{self.path} is not a positional segment")
+        entry = self._find_term(term_key(term))
+        if entry is None:
+            return None
+        _, _, df, offset, size, _, _ = entry
+        return decode_positional(self._postings[offset:offset + size], df)
+
+    def _decode(self, entry: tuple) -> PostingsList:
+        _, _, df, offset, gap_bytes, max_score, scale = entry
+        doc_ids = decode_gaps(self._postings[offset:offset + gap_bytes], df)
+        quantized = self._postings[offset + gap_bytes:offset + gap_bytes + 2 * df].cast('H')
+        if sys.byteorder != 'little':
+            quantized = array('H', quantized)
+            quantized.byteswap()
+        return PostingsList(doc_ids=doc_ids, weights=[q * scale for q in quantized], max_score=max_score)
+
+    def iter_postings(self) -> Iterable[tuple]:
+        """Yield (term key, PostingsList) for every term, in key order"""
+        if self.positional:
+            raise ValueError(f"{self.path} is a positional segment")
+        for index in range(self.num_terms):
+            entry = self._term_entry(index)
+            start = self._keys_start + entry[0]
+            key = str(self._terms[start:start + entry[1]], 'utf-8')
+            yield key, self._decode(entry)
+
+    def _find_doc(self, doc_id: int) -> Optional[tuple]:
+        lo, hi = 0, self.num_docs
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = DOC_ENTRY.unpack_from(self._docs, HEADER.size + mid * DOC_ENTRY.size)
+            if entry[0] < doc_id:
+                lo = mid + 1
+            elif entry[0] > doc_id:
+                hi = mid
+            else:
+                return entry
+        return None
+
+    def norms(self, doc_ids: Iterable[int]) -> Dict[int, float]:
+        found = {}
+        for doc_id in doc_ids:
+            entry = self._find_doc(doc_id)
+            if entry is not None:
+                found[doc_id] = entry[4]
+        return found
+
+    def all_norms(self) -> Dict[int, float]:
+        return {
+            entry[0]: entry[4]
+            for entry in DOC_ENTRY.iter_unpack(self._docs[HEADER.size:HEADER.size + self.num_docs * DOC_ENTRY.size])
+        }
+
+    def documents(self, doc_ids: Iterable[int]) -> Dict[int, str]:
+        found = {}
+        for doc_id in doc_ids:
+            entry = self._find_doc(doc_id)
+            if entry is not None:
+                _, offset, size, _, _ = entry
+                found[doc_id] = str(self._contents[offset:offset + size], 'utf-8')
+        return found
+
+    def close(self):
+        # Views must be released before their maps can be closed
+        for view in (self._terms, self._postings, self._docs, self._contents):
+            view.release()
+        for mapped in self._maps:
+            mapped.close()
+        for f in self._files:
+            f.close()
+
+
+class SegmentBackend:
+    """Index stored as immutable, memory-mapped segment files under `index_dir`
+
+    Each build writes a new segment and atomically repoints the `CURRENT`
+    file at it, so readers never observe a partially written index.
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        os.makedirs(index_dir, exist_ok=True)
+        self.reader = None
+        self.stale = False
+        self.reload()
+
+    def _current_file(self) -> str:
+        return os.path.join(self.index_dir, 'CURRENT')
+
+    def reload(self):
+        """(Re)open the segment named by CURRENT, if any"""
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        try:
+            with open(self._current_file(), encoding='utf-8') as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return
+        self.reader = SegmentReader(os.path.join(self.index_dir, name))
+
+    def publish(self, build_path: str):
+        """Move a finished build into place and make it the current segment"""
+        previous = self.reader.path if self.reader is not None else None
+        existing = [name for name in os.listdir(self.index_dir) if name.startswith('segment-')]
+        number = max((int(name.split('-')[1]) for name in existing), default=0) + 1
+        name = f'segment-{number:06d}'
+        # mkdtemp creates owner-only directories; segments are meant to be shared read-only
+        os.chmod(build_path, 0o755)
+        os.rename(build_path, os.path.join(self.index_dir, name))
+
+        tmp = self._current_file() + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(name)
+        os.replace(tmp, self._current_file())
+        self.reload()
+
+        # Open maps stay valid after unlinking, so other readers are unaffected
+        if previous is not None:
+            shutil.rmtree(previous, ignore_errors=True)
+
+    def clear(self):
+        """Remove every segment"""
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        for name in os.listdir(self.index_dir):
+            if name.startswith(('segment-', '.building-')):
+                shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
+        if os.path.exists(self._current_file()):
+            os.remove(self._current_file())
+
+    def writer(self, batch_size: int = 1000) -> SegmentWriter:
+        """Return a writer for a new segment; batch_size is unused"""
+        return SegmentWriter(self)
+
+    def fetch_postings(self, term) -> Optional[PostingsList]:
+        return self.reader.postings(term) if self.reader is not None else None
+
+    def fetch_positions(self, term) -> Optional[PositionalPostings]:
+        return self.reader.positions(term) if self.reader is not None else None
+
+    def document_count(self) -> int:
+        return self.reader.num_docs if self.reader is not None else 0
+
+    def fetch_norms(self, doc_ids: Iterable[int]) -> Dict[int, float]:
+        return self.reader.norms(doc_ids) if self.reader is not None else {}
+
+    def fetch_documents(self, doc_ids: Iterable[int]) -> Dict[int, str]:
+        return self.reader.documents(doc_ids) if self.reader is not None else {}
+
+    def iter_postings(self) -> Iterable[tuple]:
+        return self.reader.iter_postings() if self.reader is not None else iter(())
+
+    def all_norms(self) -> Dict[int, float]:
+        return self.reader.all_norms() if self.reader is not None else {}
+
+    def load_vocabulary(self) -> Dict[str, int]:
+        return {}
+
+    def load_tokens(self) -> List[str]:
+        return self.reader.tokens() if self.reader is not None else []
+
+    def index_size(self) -> Dict[str, int]:
+        """Return the bytes taken by the current segment's files"""
+        if self.reader is None:
+            return {'data_bytes': 0, 'index_bytes': 0}
+        sizes = {name: os.path.getsize(os.path.join(self.reader.path, name))
+                 for name in os.listdir(self.reader.path)}
+        # terms.dat and docs.dat are the lookup tables; the rest is postings and contents
+        index_bytes = sizes.get('terms.dat', 0) + sizes.get('docs.dat', 0)
+        return {'data_bytes': sum(sizes.values()) - index_bytes, 'index_bytes': index_bytes}
+
+    def _immutable(self, *args, **kwargs):
+        raise ValueError("Segments are immutable; rebuild the index with bulk_index_documents")
+
+    next_doc_id = add_document = update_document = delete_document = refresh_weights = _immutable
@@ -1,21 +1,97 @@
-import re
 import math
-from pymongo import MongoClient
-from typing import List, Dict, Any
+import json
+import time
+import heapq
+import bisect
+import tempfile
+import multiprocessing
+from contextlib import nullcontext
+from itertools import islice
+from typing import List, Dict, Any, Iterable, Optional
+from index_backends import PostingsList, PositionalPostings, MongoBackend, SegmentBackend
+from query_cache import QueryCache, MISSING
+from query_trace import QueryTrace, TraceSummary
+from tokenizer import Tokenizer, deep_sizeof
+
+def index_shard(shard: tuple) -> tuple:
+    """Tokenize a shard of consecutive documents into partial postings
+
+    Runs in worker processes during parallel builds. Returns the shard's
+    first doc id and contents, each term's (doc_id, tf) postings in doc
+    order (terms in first-seen order), each document's token count and,
+    for a positional build, each unigram's (doc_id, positions) postings
+    (otherwise None).
+    """
+    tokenizer, first_doc_id, contents, positional = shard
+    postings = {}
+    lengths = []
+    positions = {} if positional else None
+    for doc_id, doc_content in enumerate(contents, first_doc_id):
+        tokens = tokenizer.tokenize(doc_content)
+        term_freq = {}
+        for term in tokenizer.ngrams(tokens):
+            term_freq[term] = term_freq.get(term, 0) + 1
+        for term, freq in term_freq.items():
+            postings.setdefault(term, []).append((doc_id, freq))
+        lengths.append(len(tokens))
+        if positional:
+            doc_positions = {}
+            for position, term in enumerate(tokenizer.unigrams(tokens)):
+                doc_positions.setdefault(term, []).append(position)
+            for term, term_positions in doc_positions.items():
+                positions.setdefault(term, []).append((doc_id, term_positions))
+    return first_doc_id, contents, postings, lengths, positions
+
+def describe_build(stats: Dict[str, Any]) -> str:
+    """One-line summary of the stats returned by bulk_index_documents"""
+    return (f"Indexed {stats['documents']} documents ({stats['postings']} postings) in {stats['seconds']:.2f}s: "
+            f"{stats['docs_per_sec']:.1f} docs/sec, {stats['postings_per_sec']:.1f} postings/sec, "
+            f"{stats['memory']['total_bytes'] / 2**20:.1f} MB of {stats['memory']['mode']} vocabulary")
+
+def min_span(positions: List[List[int]]) -> int:
+    """Smallest distance between the first and last word of a window holding one position from each list"""
+    heap = [(term_positions[0], i, 0) for i, term_positions in enumerate(positions)]
+    heapq.heapify(heap)
+    high = max(position for position, _, _ in heap)
+    best = high - heap[0][0]
+    # Advance the lowest position each time; the window can only shrink by moving its start
+    while True:
+        low, i, j = heapq.heappop(heap)
+        best = min(best, high - low)
+        if j + 1 == len(positions[i]):
+            return best
+        following = positions[i][j + 1]
+        high = max(high, following)
+        heapq.heappush(heap, (following, i, j + 1))
 
 class SearchEngine:
-    def __init__(self):
-        # MongoDB connection
-        self.client = MongoClient('mongodb://localhost:27017/')
-        self.db = self.client['search_engine_db']
+    def __init__(self, backend: str = 'mongo', index_dir: Optional[str] = None,
+                 cache_results: int = 0, cache_postings: int = 0, reset: bool = True,
+                 tokenizer: str = 'string', hash_bits: int = 24, mongo_client: Any = None,
+                 index: str = 'ngram'):
+        # Index storage: MongoDB collections (dropped first unless reset is False)
+        # or memory-mapped segment files. mongo_client overrides the default
+        # local connection, e.g. with a mongomock client
+        if backend == 'mongo':
+            self.backend = MongoBackend(reset=reset, client=mongo_client)
+            self.client = self.backend.client
+            self.db = self.backend.db
+            self.terms_collection = self.backend.terms_collection
+            self.documents_collection = self.backend.documents_collection
+        elif backend == 'segment':
+            if index_dir is None:
+                raise ValueError("index_dir is required for the segment backend")
+            self.backend = SegmentBackend(index_dir)
+        else:
+            raise ValueError(f"Unknown backend: {backend}")
         
-        # Clear existing collections
-        self.db['terms'].drop()
-        self.db['documents'].drop()
-        
-        # Initialize collections
-        self.terms_collection = self.db['terms']
-        self.documents_collection = self.db['documents']
+        # 'ngram' stores every unigram, bigram and trigram as a term with its
+        # TF-IDF weights. 'positional' stores only unigrams with their token
+        # positions and derives n-gram postings at query time; it also answers
+        # phrase_search and proximity_search, but cannot be updated in place
+        if index not in ('ngram', 'positional'):
+            raise ValueError(f"Unknown index mode: {index}")
+        self.index_mode = index
         
         # Documents to be indexed
         self.documents = [
@@ -25,30 +101,67 @@ class SearchEngine:
             "The medication caused a headache and nausea, but no dizziness was reported."
         ]
         
-        # Vocabulary tracking
-        self.vocabulary = {}
+        # Terms are n-gram strings, or integer ids from interning or feature hashing
+        self.tokenizer = Tokenizer(tokenizer, hash_bits=hash_bits)
+        
+        # Interned token ids are saved with the index, so a kept index is queried
+        # and extended with the ids it was built with
+        if tokenizer == 'intern':
+            self.tokenizer.load_tokens(self.backend.load_tokens())
+        self._saved_tokens = len(self.tokenizer.token_ids)
+        
+        # Vocabulary tracking, continued from an existing index if one was kept.
+        # Integer term ids serve as their own positions, so no vocabulary is kept for them
+        self.vocabulary = self.backend.load_vocabulary() if tokenizer == 'string' else {}
+        
+        # Optional LRU caches of ranked results (entries) and postings (total postings)
+        self.cache = None
+        if cache_results > 0 or cache_postings > 0:
+            self.cache = QueryCache(max_results=cache_results, max_postings=cache_postings)
+        
+        # Sparse document matrix for search_batch, loaded on first use
+        self._document_matrix = None
+        
+        # Number of indexed documents, for positional IDFs; loaded on first use
+        self._num_docs = None
+        
+        # QueryTrace of the query being explained, if any
+        self._trace = None
     
     def preprocess_text(self, text: str) -> List[str]:
         """Remove punctuation and lowercase words"""
-        text = re.sub(r'[^\w\s]', '', text.lower())
-        return text.split()
+        return self.tokenizer.tokenize(text)
     
-    def generate_ngrams(self, tokens: List[str]) -> List[str]:
-        """Generate unigrams, bigrams, and trigrams"""
-        # Unigrams
-        ngrams = tokens.copy()
-        
-        # Bigrams
-        bigrams = [f"{tokens[i]} {tokens[i+1]}" for i in range(len(tokens)-1)]
-        
-        # Trigrams
-        trigrams = [f"{tokens[i]} {tokens[i+1]} {tokens[i+2]}" 
-                    for i in range(len(tokens)-2)]
-        
-        return ngrams + bigrams + trigrams
+    def generate_ngrams(self, tokens: List[str], add: bool = True) -> List[Any]:
+        """Generate unigrams, bigrams, and trigrams
+
+        ``add=False`` is used for queries so that unseen tokens are not
+        added to an interned token dictionary.
+        """
+        return self.tokenizer.ngrams(tokens, add)
+    
+    def _position(self, term: Any) -> int:
+        """Return the term's vocabulary position, assigning the next one if new"""
+        if self.tokenizer.mode != 'string':
+            return term
+        if term not in self.vocabulary:
+            self.vocabulary[term] = len(self.vocabulary)
+        return self.vocabulary[term]
+    
+    def memory_usage(self) -> Dict[str, Any]:
+        """Report memory held by the vocabulary and the tokenizer's dictionary"""
+        usage = self.tokenizer.memory_usage()
+        usage['vocabulary_entries'] = len(self.vocabulary)
+        usage['vocabulary_bytes'] = deep_sizeof(self.vocabulary)
+        usage['total_bytes'] = usage['vocabulary_bytes'] + usage['token_dictionary_bytes']
+        return usage
     
     def index_documents(self):
         """Create inverted index in MongoDB"""
+        # Immutable segments and positional indexes can only be written in one go
+        if not isinstance(self.backend, MongoBackend) or self.index_mode == 'positional':
+            return self.bulk_index_documents()
+        
         # Track term frequencies across all documents
         term_doc_freq = {}
         
@@ -76,13 +189,8 @@ class SearchEngine:
             for term in ngrams:
                 term_freq[term] = term_freq.get(term, 0) + 1
             
-            # Insert document
-            self.documents_collection.insert_one({
-                '_id': doc_id,
-                'content': doc_content
-            })
-            
-            # Calculate and store TF-IDF
+            # Calculate TF-IDF
+            term_weights = {}
             for term, freq in term_freq.items():
                 # TF: term frequency
                 tf = 1 + math.log(freq)
@@ -91,93 +199,707 @@ class SearchEngine:
                 idf = math.log(len(self.documents) / (term_doc_freq[term] + 1)) + 1
                 
                 # TF-IDF
-                tfidf = tf * idf
-                
+                term_weights[term] = tf * idf
+            
+            # Insert document with its precomputed vector norm and length
+            doc_norm = math.sqrt(sum(w**2 for w in term_weights.values()))
+            self.documents_collection.insert_one({
+                '_id': doc_id,
+                'content': doc_content,
+                'norm': doc_norm,
+                'length': len(tokens)
+            })
+            
+            # Store TF-IDF
+            for term, tfidf in term_weights.items():
                 # Assign unique position in vocabulary
-                if term not in self.vocabulary:
-                    self.vocabulary[term] = len(self.vocabulary)
+                pos = self._position(term)
                 
-                # Update terms collection
+                # Update terms collection, tracking the term's upper-bound score
                 self.terms_collection.update_one(
                     {'_id': term},
                     {'$addToSet': {'docs': {
                         'doc_id': doc_id, 
+                        'tf': term_freq[term],
                         'tf_idf': tfidf,
-                        'pos': self.vocabulary[term]
-                    }}},
+                        'pos': pos
+                    }},
+                     '$max': {'max_score': tfidf / doc_norm},
+                     '$inc': {'df': 1}},
                     upsert=True
                 )
+        
+        self._save_tokens()
+        self._index_changed()
     
-    def vector_space_search(self, query: str) -> List[Dict[str, Any]]:
-        """Perform vector space model search"""
-        # Preprocess query
-        query_tokens = self.preprocess_text(query)
-        query_ngrams = self.generate_ngrams(query_tokens)
-        
-        # Find matching documents
-        matching_doc_ids = set()
-        for term in query_ngrams:
-            term_record = self.terms_collection.find_one({'_id': term})
-            if term_record:
-                matching_doc_ids.update(
-                    doc['doc_id'] for doc in term_record.get('docs', [])
-                )
+    def bulk_index_documents(self, documents: Optional[Iterable[str]] = None,
+                             batch_size: int = 1000,
+                             max_postings_in_memory: Optional[int] = None,
+                             workers: int = 1, shard_size: int = 1000) -> Dict[str, float]:
+        """Create inverted index in one tokenization pass using batched writes
+
+        The corpus is tokenized in shards of ``shard_size`` documents, in a
+        pool of ``workers`` processes when more than one is requested.
+        Partial postings are merged in doc order, held in memory or spilled
+        to sorted temporary runs once ``max_postings_in_memory`` is reached,
+        and handed to the backend's writer (``bulk_write``/``insert_many``
+        batches of ``batch_size`` for MongoDB, a new segment for the segment
+        backend) once global document frequencies are known. The build
+        replaces any index the backend already holds.
+
+        A positional build still counts n-gram frequencies to compute the
+        document norms, so its scores match the n-gram index, but writes
+        only the unigram position postings (held in memory until written).
+        """
+        if documents is None:
+            documents = self.documents
+        start = time.perf_counter()
+        # The writer replaces the whole index, so term positions and saved tokens start over
+        self.vocabulary = {}
+        self._saved_tokens = 0
+        writer = self.backend.writer(batch_size)
+
+        positional = self.index_mode == 'positional'
+        term_doc_freq = {}
+        postings = {}
+        positions = {}
+        buffered_postings = 0
+        runs = []
+        doc_batch = []
+        num_docs = 0
+        num_postings = 0
+
+        # Single pass: tokenize once, merge shard document frequencies and postings
+        for first_doc_id, contents, shard_postings, lengths, shard_positions in self._tokenize_shards(
+                documents, workers, shard_size):
+            for term, term_postings in shard_postings.items():
+                term_doc_freq[term] = term_doc_freq.get(term, 0) + len(term_postings)
+                if not positional:
+                    self._position(term)
+                    num_postings += len(term_postings)
+                postings.setdefault(term, []).extend(term_postings)
+                buffered_postings += len(term_postings)
+            if positional:
+                for term, term_positions in shard_positions.items():
+                    positions.setdefault(term, []).extend(term_positions)
+                    num_postings += len(term_positions)
+
+            for doc_id, (doc_content, length) in enumerate(zip(contents, lengths), first_doc_id):
+                doc_batch.append({'_id': doc_id, 'content': doc_content, 'length': length})
+                if len(doc_batch) >= batch_size:
+                    writer.add_documents(doc_batch)
+                    doc_batch = []
+            num_docs += len(contents)
+
+            if max_postings_in_memory and buffered_postings >= max_postings_in_memory:
+                runs.append(self._spill_postings(postings))
+                postings = {}
+                buffered_postings = 0
+
+        if doc_batch:
+            writer.add_documents(doc_batch)
+
+        if runs and postings:
+            runs.append(self._spill_postings(postings))
+
+        def merged_postings():
+            return self._merge_postings_runs(runs) if runs else postings.items()
+
+        # First pass over the postings: document vector norms
+        norms = {}
+        for term, term_postings in merged_postings():
+            idf = math.log(num_docs / (term_doc_freq[term] + 1)) + 1
+            for doc_id, freq in term_postings:
+                norms[doc_id] = norms.get(doc_id, 0.0) + ((1 + math.log(freq)) * idf)**2
+        writer.set_norms({doc_id: math.sqrt(norm_sq) for doc_id, norm_sq in norms.items()})
+
+        # Second pass: write the postings, from which the writer derives upper-bound scores
+        if positional:
+            for term, term_positions in positions.items():
+                writer.add_positions(term, term_positions)
+        else:
+            for term, term_postings in merged_postings():
+                idf = math.log(num_docs / (term_doc_freq[term] + 1)) + 1
+                writer.add_term(term, self._position(term), [
+                    (doc_id, freq, (1 + math.log(freq)) * idf) for doc_id, freq in term_postings
+                ])
+        if self.tokenizer.mode == 'intern':
+            writer.set_tokens(self.tokenizer.tokens())
+            self._saved_tokens = len(self.tokenizer.token_ids)
+        writer.close()
+        self._index_changed()
+
+        for run in runs:
+            run.close()
+
+        elapsed = time.perf_counter() - start
+        stats = {
+            'index': self.index_mode,
+            'documents': num_docs,
+            'postings': num_postings,
+            'terms': len(positions) if positional else len(term_doc_freq),
+            'spilled_runs': len(runs),
+            'workers': workers,
+            'memory': self.memory_usage(),
+            'seconds': elapsed,
+            'docs_per_sec': num_docs / elapsed if elapsed > 0 else 0.0,
+            'postings_per_sec': num_postings / elapsed if elapsed > 0 else 0.0
+        }
+        return stats
+
+    def _tokenize_shards(self, documents: Iterable[str], workers: int, shard_size: int) -> Iterable[tuple]:
+        """Yield index_shard results for consecutive shards, in doc order"""
+        def shards():
+            it = iter(documents)
+            first_doc_id = 1
+            while True:
+                contents = list(islice(it, shard_size))
+                if not contents:
+                    return
+                yield first_doc_id, contents
+                first_doc_id += len(contents)
         
-        # Calculate scores for matching documents
-        results = []
-        for doc_id in matching_doc_ids:
-            doc = self.documents_collection.find_one({'_id': doc_id})
-            
-            # Compute document vector
-            doc_vector = {}
-            doc_tokens = self.preprocess_text(doc['content'])
-            doc_ngrams = self.generate_ngrams(doc_tokens)
-            
-            # Get TF-IDF for document terms
-            for term in set(doc_ngrams):
-                term_record = self.terms_collection.find_one({'_id': term})
-                if term_record:
-                    for doc_term in term_record.get('docs', []):
-                        if doc_term['doc_id'] == doc_id:
-                            doc_vector[term] = doc_term['tf_idf']
-                            break
+        positional = self.index_mode == 'positional'
+        if workers <= 1:
+            yield from map(index_shard, ((self.tokenizer,) + shard + (positional,) for shard in shards()))
+            return
+        if self.tokenizer.mode == 'intern':
+            raise ValueError("Interned term ids need one shared dictionary; use tokenizer='hash' for parallel builds")
+        with multiprocessing.Pool(workers) as pool:
+            # imap keeps shard order, so merged postings stay sorted by doc id
+            yield from pool.imap(index_shard, ((self.tokenizer,) + shard + (positional,) for shard in shards()))
+    
+    def _spill_postings(self, postings: Dict[str, List]) -> Any:
+        """Write a sorted run of buffered postings to a temporary file"""
+        run = tempfile.TemporaryFile('w+', encoding='utf-8')
+        for term in sorted(postings):
+            run.write(json.dumps([term, postings[term]]) + '\n')
+        run.seek(0)
+        return run
+
+    def _merge_postings_runs(self, runs: List[Any]) -> Iterable:
+        """Merge sorted runs, yielding each term with its postings in doc order"""
+        for run in runs:
+            run.seek(0)
+        streams = [(json.loads(line) for line in run) for run in runs]
+        current_term, current_postings = None, []
+        # heapq.merge is stable, so earlier runs (lower doc ids) come first
+        for term, term_postings in heapq.merge(*streams, key=lambda entry: entry[0]):
+            if term != current_term:
+                if current_term is not None:
+                    yield current_term, current_postings
+                current_term, current_postings = term, []
+            current_postings.extend(term_postings)
+        if current_term is not None:
+            yield current_term, current_postings
+
+    def _term_frequencies(self, content: str) -> tuple:
+        """Tokenize a document, returning its tokens and n-gram frequencies"""
+        tokens = self.preprocess_text(content)
+        term_freq = {}
+        for term in self.generate_ngrams(tokens):
+            term_freq[term] = term_freq.get(term, 0) + 1
+        return tokens, term_freq
+    
+    def _save_tokens(self):
+        """Save tokens interned since the last save with the index"""
+        tokens = self.tokenizer.tokens()[self._saved_tokens:]
+        if tokens:
+            self.backend.add_tokens(self._saved_tokens + 1, tokens)
+            self._saved_tokens += len(tokens)
+    
+    def _require_ngram_index(self):
+        if self.index_mode == 'positional':
+            raise ValueError("The positional index cannot be updated in place; "
+                             "rebuild it with bulk_index_documents")
+    
+    def add_document(self, content: str, doc_id: Optional[int] = None) -> int:
+        """Index one new document in place and return its id"""
+        self._require_ngram_index()
+        if doc_id is None:
+            doc_id = self.backend.next_doc_id()
+        tokens, term_freq = self._term_frequencies(content)
+        positions = {term: self._position(term) for term in term_freq}
+        self.backend.add_document(doc_id, content, len(tokens), term_freq, positions)
+        self._save_tokens()
+        self._index_changed()
+        return doc_id
+    
+    def update_document(self, doc_id: int, content: str) -> bool:
+        """Replace a document's content, touching only the postings that change"""
+        self._require_ngram_index()
+        old_content = self.fetch_documents([doc_id]).get(doc_id)
+        if old_content is None:
+            return False
+        _, old_term_freq = self._term_frequencies(old_content)
+        tokens, term_freq = self._term_frequencies(content)
+        positions = {term: self._position(term) for term in term_freq}
+        self.backend.update_document(doc_id, content, len(tokens), old_term_freq, term_freq, positions)
+        self._save_tokens()
+        self._index_changed()
+        return True
+    
+    def delete_document(self, doc_id: int) -> bool:
+        """Remove a document and its postings from the index"""
+        self._require_ngram_index()
+        deleted = self.backend.delete_document(doc_id)
+        if deleted:
+            self._index_changed()
+        return deleted
+    
+    def refresh_weights(self):
+        """Recompute IDF-dependent weights after add/update/delete calls
+
+        Runs automatically before the next search; call it directly to pay
+        the cost up front, e.g. after a batch of changes.
+        """
+        self.backend.refresh_weights()
+        self._index_changed()
+    
+    def vector_space_search(self, query: str, top_k: Optional[int] = None,
+                            exhaustive: bool = False, explain: bool = False) -> Any:
+        """Perform vector space model search
+
+        With ``top_k`` only the best ``top_k`` documents are returned, found
+        with MaxScore dynamic pruning unless ``exhaustive`` is set, in which
+        case every matching document is scored before the top k are selected.
+
+        With ``explain`` the query is traced and a ``(results, explain)``
+        tuple is returned: the time spent in each stage (tokenize, fetch,
+        score, sort, ...), backend round trips by method, and the sizes of
+        the postings and candidate sets (see QueryTrace).
+        """
+        if not explain:
+            return self._search(query, top_k, exhaustive)
+        self._trace = QueryTrace(query)
+        try:
+            results = self._search(query, top_k, exhaustive)
+            return results, self._trace.explain()
+        finally:
+            self._trace = None
+    
+    def _search(self, query: str, top_k: Optional[int], exhaustive: bool) -> List[Dict[str, Any]]:
+        trace = self._trace
+        
+        # Weights are refreshed lazily after incremental changes
+        if self.backend.stale:
+            with self._stage('refresh_weights'):
+                self.refresh_weights()
+        
+        # Preprocess query; the positional index keys n-grams as tuples of unigram terms
+        with self._stage('tokenize'):
+            query_tokens = self.preprocess_text(query)
+            if self.index_mode == 'positional':
+                query_ngrams = self._query_phrases(self.tokenizer.unigrams(query_tokens, add=False))
+            else:
+                query_ngrams = self.generate_ngrams(query_tokens, add=False)
+        if trace is not None:
+            trace.count('query_terms', len(set(query_ngrams)))
+        
+        # Queries with the same distinct n-grams always rank the same way
+        cache_key = None
+        if self.cache is not None:
+            cache_key = (tuple(sorted(set(query_ngrams))), top_k, exhaustive)
+            cached = self.cache.results.get(cache_key)
+            if cached is not MISSING:
+                if trace is not None:
+                    trace.cached = True
+                    trace.count('results', len(cached))
+                return [dict(result) for result in cached]
+        
+        # Fetch each distinct query term's postings exactly once
+        if self.index_mode == 'positional':
+            with self._stage('phrase_match'):
+                postings_lists, norms = self._phrase_postings_lists(list(dict.fromkeys(query_ngrams)))
+        else:
+            norms = None
+            postings_lists = []
+            for term in dict.fromkeys(query_ngrams):
+                postings = self.fetch_postings(term)
+                if postings:
+                    postings_lists.append(postings)
+        if trace is not None:
+            trace.count('postings_lists', len(postings_lists))
+            trace.count('postings', sum(len(postings.doc_ids) for postings in postings_lists))
+            trace.count('candidates', len(set().union(*(postings.doc_ids for postings in postings_lists))))
+        
+        if not postings_lists:
+            if cache_key is not None:
+                self.cache.results.put(cache_key, [])
+            return []
+        
+        with self._stage('score'):
+            if top_k is not None and not exhaustive:
+                ranked = self._max_score_top_k(postings_lists, top_k, norms)
+            else:
+                ranked = self._score_exhaustive(postings_lists, top_k, norms)
+        
+        docs = self.fetch_documents(doc_id for doc_id, _ in ranked)
+        results = [
+            {'content': docs[doc_id], 'score': score}
+            for doc_id, score in ranked if doc_id in docs
+        ]
+        if trace is not None:
+            trace.count('results', len(results))
+        if cache_key is not None:
+            self.cache.results.put(cache_key, [dict(result) for result in results])
+        return results
+    
+    def phrase_search(self, query: str, top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Find documents containing all of the query's words as one consecutive phrase
+
+        Phrases may have any length. Matches are ranked by the score
+        vector_space_search gives them. Requires the positional index.
+        """
+        terms = self._positional_query_terms(query)
+        if not terms:
+            return []
+        lookups = self._fetch_positions_of(terms)
+        matches = self._phrase_frequencies([lookups[term] for term in terms])
+        return self._rank_matches(terms, matches.keys(), top_k)
+    
+    def proximity_search(self, query: str, window: int, top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Find documents containing every word of the query within ``window`` consecutive tokens
+
+        Words may appear in any order. Matches are ranked by the score
+        vector_space_search gives them. Requires the positional index.
+        """
+        terms = self._positional_query_terms(query)
+        if not terms:
+            return []
+        lookups = self._fetch_positions_of(terms)
+        distinct = [lookups[term] for term in dict.fromkeys(terms)]
+        matches = [doc_id for doc_id, doc_positions in self._intersect_positions(distinct)
+                   if min_span(doc_positions) < window]
+        return self._rank_matches(terms, matches, top_k)
+    
+    def _positional_query_terms(self, query: str) -> Optional[List[Any]]:
+        """Unigram terms of a phrase or proximity query, or None if a word is not indexed"""
+        if self.index_mode != 'positional':
+            raise ValueError("Phrase and proximity search require index='positional'")
+        terms = self.tokenizer.unigrams(self.preprocess_text(query), add=False)
+        if not terms or None in terms:
+            return None
+        return terms
+    
+    def _query_phrases(self, terms: List[Any]) -> List[tuple]:
+        """The query's unigrams, bigrams and trigrams as term tuples, in generate_ngrams order"""
+        return [tuple(terms[i:i + n]) for n in (1, 2, 3) for i in range(len(terms) - n + 1)
+                if None not in terms[i:i + n]]
+    
+    def _fetch_positions_of(self, terms: Iterable[Any]) -> Dict[Any, Optional[Dict[int, List[int]]]]:
+        """Map each distinct term to {doc_id: positions} in doc id order, or None if not indexed"""
+        lookups = {}
+        for term in dict.fromkeys(terms):
+            postings = self.fetch_positions(term)
+            lookups[term] = dict(zip(postings.doc_ids, postings.positions)) if postings else None
+        return lookups
+    
+    def _intersect_positions(self, lookups: List[Optional[Dict[int, List[int]]]]) -> Iterable[tuple]:
+        """Yield (doc_id, [positions of each term]) for documents containing every term, in doc id order"""
+        if not lookups or None in lookups:
+            return
+        rarest = min(lookups, key=len)
+        for doc_id in rarest:
+            doc_positions = [lookup.get(doc_id) for lookup in lookups]
+            if None not in doc_positions:
+                yield doc_id, doc_positions
+    
+    def _phrase_frequencies(self, lookups: List[Optional[Dict[int, List[int]]]]) -> Dict[int, int]:
+        """Count each document's occurrences of a phrase, given its words' positions in order"""
+        if len(lookups) == 1:
+            return {doc_id: len(positions) for doc_id, positions in lookups[0].items()} if lookups[0] else {}
+        frequencies = {}
+        for doc_id, doc_positions in self._intersect_positions(lookups):
+            # Phrase starts are the first word's positions that every later word follows at its offset
+            starts = set(doc_positions[0])
+            for offset, positions in enumerate(doc_positions[1:], 1):
+                starts.intersection_update(position - offset for position in positions)
+                if not starts:
+                    break
+            if starts:
+                frequencies[doc_id] = len(starts)
+        return frequencies
+    
+    def _phrase_postings_lists(self, phrases: List[tuple], doc_ids: Optional[set] = None) -> tuple:
+        """Weighted postings of n-gram phrases, derived from unigram positions
+
+        Weights use the n-gram index's TF-IDF formula with the phrase's own
+        frequencies, so scores match the n-gram index. With ``doc_ids`` the
+        postings are restricted to those documents, but a phrase found
+        elsewhere still counts towards the query norm. Returns the postings
+        lists and the norms of the documents in them.
+        """
+        lookups = self._fetch_positions_of(term for phrase in phrases for term in phrase)
+        matches = [self._phrase_frequencies([lookups[term] for term in phrase]) for phrase in phrases]
+        matches = [frequencies for frequencies in matches if frequencies]
+        if not matches:
+            return [], {}
+        
+        num_docs = self._document_count()
+        idfs = [math.log(num_docs / (len(frequencies) + 1)) + 1 for frequencies in matches]
+        if doc_ids is not None:
+            matches = [{doc_id: freq for doc_id, freq in frequencies.items() if doc_id in doc_ids}
+                       for frequencies in matches]
+        norms = self.fetch_norms({doc_id for frequencies in matches for doc_id in frequencies})
+        
+        postings_lists = []
+        for frequencies, idf in zip(matches, idfs):
+            weights = [(1 + math.log(freq)) * idf for freq in frequencies.values()]
+            bounds = [weight / norms[doc_id] for doc_id, weight in zip(frequencies, weights) if norms.get(doc_id)]
+            postings_lists.append(PostingsList(doc_ids=list(frequencies), weights=weights,
+                                               max_score=max(bounds, default=0.0)))
+        return postings_lists, norms
+    
+    def _rank_matches(self, terms: List[Any], doc_ids: Iterable[int],
+                      top_k: Optional[int]) -> List[Dict[str, Any]]:
+        """Rank matching documents by the query's n-gram cosine score"""
+        doc_ids = set(doc_ids)
+        if not doc_ids:
+            return []
+        postings_lists, norms = self._phrase_postings_lists(list(dict.fromkeys(self._query_phrases(terms))),
+                                                           doc_ids)
+        ranked = self._score_exhaustive(postings_lists, top_k, norms)
+        docs = self.fetch_documents(doc_id for doc_id, _ in ranked)
+        return [{'content': docs[doc_id], 'score': score} for doc_id, score in ranked if doc_id in docs]
+    
+    def _document_count(self) -> int:
+        if self._num_docs is None:
+            self._num_docs = self._backend_call('document_count')
+        return self._num_docs
+    
+    def _stage(self, name: str) -> Any:
+        """Time a block into the current query trace, if the query is being explained"""
+        return self._trace.stage(name) if self._trace is not None else nullcontext()
+    
+    def _backend_call(self, method: str, *args) -> Any:
+        """Call a backend lookup, counting it as a round trip of the current query trace"""
+        if self._trace is None:
+            return getattr(self.backend, method)(*args)
+        with self._trace.stage(method):
+            self._trace.round_trip(method)
+            return getattr(self.backend, method)(*args)
+    
+    def _score_exhaustive(self, postings_lists: List[PostingsList], top_k: Optional[int] = None,
+                          norms: Optional[Dict[int, float]] = None) -> List[tuple]:
+        """Term-at-a-time cosine scoring of every matching document
+
+        ``norms`` may hold the candidates' norms if the caller already fetched them.
+        """
+        # Accumulate the dot product of the (binary) query and document vectors
+        accumulators = {}
+        for postings in postings_lists:
+            for doc_id, tf_idf in zip(postings.doc_ids, postings.weights):
+                accumulators[doc_id] = accumulators.get(doc_id, 0.0) + tf_idf
+        
+        # Cosine similarity from the accumulated scores and stored norms
+        if norms is None:
+            norms = self.fetch_norms(accumulators.keys())
+        query_norm = math.sqrt(len(postings_lists))
+        scored = []
+        for doc_id in sorted(accumulators):
+            doc_norm = norms.get(doc_id, 0.0)
+            if query_norm * doc_norm > 0:
+                scored.append((doc_id, round(accumulators[doc_id] / (query_norm * doc_norm), 2)))
+        if self._trace is not None:
+            self._trace.count('scored', len(scored))
+        
+        # Sort by score in descending order (ties keep ascending doc id order)
+        with self._stage('sort'):
+            if top_k is not None:
+                return heapq.nlargest(top_k, scored, key=lambda x: x[1])
+            return sorted(scored, key=lambda x: x[1], reverse=True)
+    
+    def _max_score_top_k(self, postings_lists: List[PostingsList], top_k: int,
+                         norms: Optional[Dict[int, float]] = None) -> List[tuple]:
+        """Document-at-a-time top-k scoring with MaxScore pruning
+
+        Terms are ordered by upper bound; once the k-th best score reaches the
+        summed bounds of the lowest terms, documents that only occur in those
+        "non-essential" terms are skipped and their postings are only probed
+        for documents found through the essential terms.
+        """
+        if top_k <= 0:
+            return []
+        
+        query_scale = 1 / math.sqrt(len(postings_lists))
+        lists = sorted(postings_lists, key=lambda p: p.max_score)
+        bounds = []
+        total = 0.0
+        for postings in lists:
+            total += postings.max_score * query_scale
+            bounds.append(total)
+        
+        def upper(value):
+            # Scores are compared after rounding, so bounds are rounded the same way
+            return round(value + 1e-9, 2)
+        
+        if norms is None:
+            candidates = set()
+            for postings in lists:
+                candidates.update(postings.doc_ids)
+            norms = self.fetch_norms(candidates)
+        
+        cursors = [0] * len(lists)
+        heap = []  # min-heap of (score, -doc_id): smaller doc ids win ties
+        threshold = None
+        first_essential = 0
+        scored = pruned_docs = 0
+        
+        while first_essential < len(lists):
+            # Next candidate is the smallest current doc id among essential terms
+            doc_id = None
+            for i in range(first_essential, len(lists)):
+                if cursors[i] < len(lists[i].doc_ids):
+                    current = lists[i].doc_ids[cursors[i]]
+                    if doc_id is None or current < doc_id:
+                        doc_id = current
+            if doc_id is None:
+                break
             
-            # Query vector
-            query_vector = {}
-            for term in query_ngrams:
-                term_record = self.terms_collection.find_one({'_id': term})
-                if term_record:
-                    for doc_term in term_record.get('docs', []):
-                        # Use query term position in vocabulary
-                        query_vector[term] = 1.0
+            doc_norm = norms.get(doc_id, 0.0)
+            score = 0.0
+            for i in range(first_essential, len(lists)):
+                postings = lists[i]
+                if cursors[i] < len(postings.doc_ids) and postings.doc_ids[cursors[i]] == doc_id:
+                    if doc_norm > 0:
+                        score += postings.weights[cursors[i]] / doc_norm
+                    cursors[i] += 1
+            if doc_norm <= 0:
+                continue
             
-            # Cosine similarity calculation
-            numerator = sum(
-                query_vector.get(term, 0) * doc_vector.get(term, 0) 
-                for term in set(list(query_vector.keys()) + list(doc_vector.keys()))
-            )
+            # Probe non-essential terms from the highest bound down, stopping
+            # as soon as the document can no longer beat the threshold
+            pruned = False
+            for i in range(first_essential - 1, -1, -1):
+                if upper(score * query_scale + bounds[i]) <= threshold:
+                    pruned = True
+                    break
+                postings = lists[i]
+                pos = bisect.bisect_left(postings.doc_ids, doc_id, cursors[i])
+                cursors[i] = pos
+                if pos < len(postings.doc_ids) and postings.doc_ids[pos] == doc_id:
+                    score += postings.weights[pos] / doc_norm
+            if pruned:
+                pruned_docs += 1
+                continue
+            scored += 1
             
-            query_norm = math.sqrt(sum(1**2 for _ in query_vector))
-            doc_norm = math.sqrt(sum(v**2 for v in doc_vector.values()))
+            entry = (round(score * query_scale, 2), -doc_id)
+            if len(heap) < top_k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+            else:
+                continue
             
-            if query_norm * doc_norm > 0:
-                cosine_sim = numerator / (query_norm * doc_norm)
-                results.append({
-                    'content': doc['content'],
-                    'score': round(cosine_sim, 2)
-                })
+            if len(heap) == top_k:
+                threshold = heap[0][0]
+                while first_essential < len(lists) and upper(bounds[first_essential]) <= threshold:
+                    first_essential += 1
         
-        # Sort results by score in descending order
-        return sorted(results, key=lambda x: x['score'], reverse=True)
+        if self._trace is not None:
+            # Documents only found in non-essential terms are never visited
+            self._trace.count('scored', scored)
+            self._trace.count('pruned', pruned_docs)
+        with self._stage('sort'):
+            return [(-neg_doc_id, score) for score, neg_doc_id in sorted(heap, reverse=True)]
     
-    def run_queries(self, queries):
-        """Execute and print results for all queries"""
+    def search_batch(self, queries: List[str], top_k: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """Score many queries at once with a sparse matrix product
+
+        Requires NumPy and SciPy. The TF-IDF matrix is loaded from the
+        index on first use and reused until the index changes. Returns one
+        result list per query, ranked as vector_space_search would.
+        """
+        if self.index_mode == 'positional':
+            raise ValueError("search_batch requires the n-gram index")
+        try:
+            from batch_search import DocumentMatrix
+        except ImportError as e:
+            raise ImportError("search_batch requires numpy and scipy") from e
+        
+        if self.backend.stale:
+            self.refresh_weights()
+        if self._document_matrix is None:
+            self._document_matrix = DocumentMatrix(self.backend)
+        
+        query_terms = [self.generate_ngrams(self.preprocess_text(query), add=False) for query in queries]
+        ranked = self._document_matrix.score(query_terms, top_k)
+        
+        docs = self.fetch_documents({doc_id for results in ranked for doc_id, _ in results})
+        return [
+            [{'content': docs[doc_id], 'score': score} for doc_id, score in results if doc_id in docs]
+            for results in ranked
+        ]
+    
+    def fetch_postings(self, term: str) -> Optional[PostingsList]:
+        """Return the postings of a term from the cache or the index backend"""
+        if self.cache is None:
+            return self._backend_call('fetch_postings', term)
+        postings = self.cache.postings.get(term)
+        if postings is MISSING:
+            postings = self._backend_call('fetch_postings', term)
+            self.cache.postings.put(term, postings)
+        elif self._trace is not None:
+            self._trace.count('postings_cache_hits')
+        return postings
+    
+    def fetch_positions(self, term: Any) -> Optional[PositionalPostings]:
+        """Return the positional postings of a unigram from the cache or the index backend"""
+        if self.cache is None:
+            return self._backend_call('fetch_positions', term)
+        postings = self.cache.postings.get(term)
+        if postings is MISSING:
+            postings = self._backend_call('fetch_positions', term)
+            self.cache.postings.put(term, postings)
+        elif self._trace is not None:
+            self._trace.count('postings_cache_hits')
+        return postings
+    
+    def fetch_norms(self, doc_ids: Iterable[int]) -> Dict[int, float]:
+        """Return the stored vector norms of a set of documents"""
+        return self._backend_call('fetch_norms', doc_ids)
+    
+    def fetch_documents(self, doc_ids: Iterable[int]) -> Dict[int, str]:
+        """Return the content of a set of documents"""
+        return self._backend_call('fetch_documents', doc_ids)
+    
+    def index_size(self) -> Dict[str, int]:
+        """Return the bytes taken by the stored index (data and lookup indexes)"""
+        return self.backend.index_size()
+    
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Return hit/miss/eviction counters for both cache levels"""
+        return self.cache.stats() if self.cache is not None else None
+    
+    def _index_changed(self):
+        """Invalidate anything derived from the previous index contents"""
+        if self.cache is not None:
+            self.cache.invalidate()
+        self._document_matrix = None
+        self._num_docs = None
+    
+    def run_queries(self, queries, explain: bool = False) -> Optional[Dict[str, Any]]:
+        """Execute and print results for all queries
+
+        With ``explain`` each query's trace is printed after its results,
+        and the traces aggregated over all queries are returned.
+        """
+        summary = TraceSummary() if explain else None
         for query in queries:
             print(f"Query: {query}")
-            results = self.vector_space_search(query)
+            if explain:
+                results, trace = self.vector_space_search(query, explain=True)
+                summary.add(trace)
+            else:
+                results = self.vector_space_search(query)
             for result in results:
                 print(f'"{result["content"]}", {result["score"]}')
+            if explain:
+                print(json.dumps(trace))
             print()
+        return summary.summary() if explain else None
 
 def main():
     # Initialize search engine
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+# Returned by LRUCache.get on a miss, so that None can be cached as a value
+MISSING = object()
+
+
+class LRUCache:
+    """Least-recently-used cache bounded by the total size of its entries
+
+    Each entry's size is given by ``sizeof`` (1 per entry by default, which
+    bounds the number of entries).
+    """
+
+    def __init__(self, max_size: int, sizeof: Callable[[Any], int] = lambda value: 1):
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._entries.get(key, MISSING)
+        if entry is MISSING:
+            self.misses += 1
+            return MISSING
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        size = self.sizeof(value)
+        # Never let one oversized entry flush the whole cache
+        if size > self.max_size:
+            return
+        if key in self._entries:
+            self.size -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self.size += size
+        while self.size > self.max_size:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'size': self.size
+        }
+
+
+class QueryCache:
+    """Two-level cache for SearchEngine: ranked results and decoded postings
+
+    Results are bounded by entry count and postings by the total number of
+    postings held. Both levels are cleared whenever the index changes.
+    """
+
+    def __init__(self, max_results: int = 1024, max_postings: int = 1_000_000):
+        self.results = LRUCache(max_results)
+        self.postings = LRUCache(max_postings, sizeof=lambda p: len(p.doc_ids) if p else 1)
+        self.invalidations = 0
+
+    def invalidate(self):
+        """Drop every cached entry after an index change"""
+        self.results.clear()
+        self.postings.clear()
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'results': self.results.stats(),
+            'postings': self.postings.stats(),
+            'invalidations': self.invalidations
+        }
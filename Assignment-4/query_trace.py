@@ -0,0 +1,128 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+
+def milliseconds(seconds: float) -> float:
+    return round(seconds * 1000, 4)
+
+
+class QueryTrace:
+    """Where one query's time went, with its backend round trips and candidate-set sizes
+
+    Stage times are exclusive: time spent in a nested stage, such as
+    fetching norms while scoring, is only counted for the inner stage, so
+    the stages add up to the query's total (the remainder is 'other').
+    Round trips count the lookups sent to the index backend, by method;
+    for MongoDB each is one query, for segments a memory-mapped lookup.
+    Postings served from the cache are not round trips.
+    """
+
+    def __init__(self, query: str):
+        self.query = query
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.round_trips = {}
+        self.counts = {}
+        self.cached = False
+        # Seconds spent in the nested stages of each open stage
+        self._nested = []
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time the enclosed block, minus its nested stages, into stage ``name``"""
+        self._nested.append(0.0)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed - self._nested.pop()
+            if self._nested:
+                self._nested[-1] += elapsed
+
+    def round_trip(self, method: str):
+        self.round_trips[method] = self.round_trips.get(method, 0) + 1
+
+    def count(self, name: str, n: int = 1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def explain(self) -> Dict[str, Any]:
+        """The trace as a JSON-serializable dict"""
+        total = time.perf_counter() - self.started
+        stages = dict(self.stages, other=max(0.0, total - sum(self.stages.values())))
+        return {
+            'query': self.query,
+            'cached': self.cached,
+            'total_ms': milliseconds(total),
+            'stages_ms': {name: milliseconds(seconds) for name, seconds in stages.items()},
+            'round_trips': dict(self.round_trips),
+            'counts': dict(self.counts)
+        }
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class TraceSummary:
+    """Aggregate of many queries' explains
+
+    Reports total latency percentiles, each stage's total time and share
+    of it, and round trips and candidate-set sizes in total and per query.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.cached = 0
+        self.totals = []
+        self.stages = {}
+        self.round_trips = {}
+        self.counts = {}
+        self.max_counts = {}
+
+    def add(self, explain: Dict[str, Any]):
+        self.queries += 1
+        self.cached += explain['cached']
+        self.totals.append(explain['total_ms'])
+        for name, ms in explain['stages_ms'].items():
+            self.stages[name] = self.stages.get(name, 0.0) + ms
+        for method, n in explain['round_trips'].items():
+            self.round_trips[method] = self.round_trips.get(method, 0) + n
+        for name, n in explain['counts'].items():
+            self.counts[name] = self.counts.get(name, 0) + n
+            self.max_counts[name] = max(self.max_counts.get(name, 0), n)
+
+    def summary(self) -> Dict[str, Any]:
+        queries = self.queries or 1
+        totals = sorted(self.totals)
+        elapsed = sum(totals)
+        return {
+            'queries': self.queries,
+            'cached': self.cached,
+            'total_ms': {
+                'sum': round(elapsed, 4),
+                'mean': round(elapsed / queries, 4),
+                'p50': percentile(totals, 50),
+                'p95': percentile(totals, 95),
+                'max': totals[-1] if totals else 0.0
+            },
+            'stages_ms': {
+                name: {'sum': round(ms, 4), 'mean': round(ms / queries, 4),
+                       'share': round(ms / elapsed, 4) if elapsed else 0.0}
+                for name, ms in sorted(self.stages.items(), key=lambda item: -item[1])
+            },
+            'round_trips': {
+                'sum': sum(self.round_trips.values()),
+                'per_query': round(sum(self.round_trips.values()) / queries, 2),
+                'by_method': dict(self.round_trips)
+            },
+            'counts': {
+                name: {'sum': n, 'mean': round(n / queries, 2), 'max': self.max_counts[name]}
+                for name, n in self.counts.items()
+            }
+        }
@@ -0,0 +1,118 @@
+import re
+import sys
+import zlib
+from typing import List, Dict, Any, Optional, Union
+
+# Compiled once instead of on every preprocess_text call
+PUNCTUATION = re.compile(r'[^\w\s]')
+
+# Odd multipliers used to mix token hashes into n-gram hashes by position
+HASH_MULTIPLIERS = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D)
+HASH_ORDER_SALT = 0x27D4EB2F
+
+Term = Union[str, int]
+
+
+def deep_sizeof(mapping: Dict) -> int:
+    """Approximate bytes held by a dict, its keys and its values"""
+    return sys.getsizeof(mapping) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in mapping.items())
+
+
+class Tokenizer:
+    """Turns text into unigram, bigram and trigram terms
+
+    Modes:
+      'string'  n-grams are space-joined strings (the original scheme)
+      'intern'  tokens are interned to dense ids starting at 1 and each
+                n-gram is one integer packing its order and token ids into
+                ``id_bits`` bits per token, so no n-gram strings are kept
+      'hash'    n-grams are hashed into ``2 ** hash_bits`` buckets straight
+                from CRC-32 token hashes; nothing is stored and different
+                n-grams may collide
+    """
+
+    def __init__(self, mode: str = 'string', hash_bits: int = 24, id_bits: int = 20):
+        if mode not in ('string', 'intern', 'hash'):
+            raise ValueError(f"Unknown tokenizer mode: {mode}")
+        # Packed ids (2 order bits + 3 tokens) must fit a signed 64-bit BSON integer
+        if 2 + 3 * id_bits > 63:
+            raise ValueError("id_bits must be at most 20")
+        self.mode = mode
+        self.hash_bits = hash_bits
+        self.hash_mask = (1 << hash_bits) - 1
+        self.id_bits = id_bits
+        self.token_ids = {}
+
+    def tokenize(self, text: str) -> List[str]:
+        """Remove punctuation and lowercase words"""
+        return PUNCTUATION.sub('', text.lower()).split()
+
+    def ngrams(self, tokens: List[str], add: bool = True) -> List[Term]:
+        """Generate unigrams, bigrams, and trigrams
+
+        In 'intern' mode, ``add=False`` (used for queries) leaves the token
+        dictionary untouched and drops n-grams containing unknown tokens,
+        since they cannot occur in the index.
+        """
+        if self.mode == 'string':
+            return (tokens
+                    + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+                    + [f"{a} {b} {c}" for a, b, c in zip(tokens, tokens[1:], tokens[2:])])
+
+        if self.mode == 'hash':
+            m1, m2, m3 = HASH_MULTIPLIERS
+            mask = self.hash_mask
+            hashes = [zlib.crc32(token.encode('utf-8')) for token in tokens]
+            return ([(h * m1 ^ HASH_ORDER_SALT) & mask for h in hashes]
+                    + [(a * m1 ^ b * m2 ^ 2 * HASH_ORDER_SALT) & mask
+                       for a, b in zip(hashes, hashes[1:])]
+                    + [(a * m1 ^ b * m2 ^ c * m3 ^ 3 * HASH_ORDER_SALT) & mask
+                       for a, b, c in zip(hashes, hashes[1:], hashes[2:])])
+
+        ids = [self._token_id(token, add) for token in tokens]
+        bits = self.id_bits
+        unigrams = [(1 << 3 * bits) | a for a in ids if a]
+        bigrams = [(2 << 3 * bits) | (a << bits) | b for a, b in zip(ids, ids[1:]) if a and b]
+        trigrams = [(3 << 3 * bits) | (a << 2 * bits) | (b << bits) | c
+                    for a, b, c in zip(ids, ids[1:], ids[2:]) if a and b and c]
+        return unigrams + bigrams + trigrams
+
+    def unigrams(self, tokens: List[str], add: bool = True) -> List[Optional[Term]]:
+        """Return one unigram term per token, so list indexes are token positions
+
+        Used by the positional index. In 'intern' mode, ``add=False`` gives
+        None for tokens that are not in the dictionary.
+        """
+        if self.mode == 'string':
+            return list(tokens)
+        if self.mode == 'hash':
+            m1 = HASH_MULTIPLIERS[0]
+            return [(zlib.crc32(token.encode('utf-8')) * m1 ^ HASH_ORDER_SALT) & self.hash_mask for token in tokens]
+        ids = [self._token_id(token, add) for token in tokens]
+        return [(1 << 3 * self.id_bits) | a if a else None for a in ids]
+
+    def _token_id(self, token: str, add: bool) -> int:
+        token_id = self.token_ids.get(token)
+        if token_id is None:
+            if not add:
+                return 0
+            token_id = len(self.token_ids) + 1
+            if token_id >> self.id_bits:
+                raise ValueError(f"More than {2 ** self.id_bits - 1} distinct tokens; raise id_bits or use hash mode")
+            self.token_ids[token] = token_id
+        return token_id
+
+    def tokens(self) -> List[str]:
+        """Interned tokens in id order (token i has id i + 1), for saving with the index"""
+        return list(self.token_ids)
+
+    def load_tokens(self, tokens: List[str]):
+        """Restore a token dictionary saved from ``tokens()``"""
+        self.token_ids = {token: token_id for token_id, token in enumerate(tokens, 1)}
+
+    def memory_usage(self) -> Dict[str, Any]:
+        return {
+            'mode': self.mode,
+            'token_dictionary_entries': len(self.token_ids),
+            'token_dictionary_bytes': deep_sizeof(self.token_ids)
+        }